@@ -2,10 +2,19 @@ bluetooth.start_uart_service()
 basic.show_icon(IconNames.HEART)
 import maqueen
 
-last_hb_time = control.millis()
-HB_TIMEOUT = 1500  # ms (1.5초)
+last_hb_time = control.millis()  # 마지막으로 명령(HB 포함)을 받은 시각
+# 라즈베리파이는 다른 명령이 HB_INTERVAL 동안 없을 때만 HB 전송 (연결 시 CFG:HB_INTERVAL 로 협상)
+HB_INTERVAL = 600        # ms (협상 전 기본값 = 이전 고정 주기)
+HB_TIMEOUT = 1500        # ms, 대기 중 링크 끊김 판정 (HB_INTERVAL * 2.5)
+DRIVE_HB_TIMEOUT = 5000  # ms, 주행 중 링크 끊김 판정 (약 5초 유지, HB_INTERVAL * 5 가 더 길면 최대 8초)
+HB_INTERVAL_MAX = 2000   # ms, 협상 가능한 최대 간격
+DRIVE_HB_MIN = 5000
+DRIVE_HB_MAX = 8000
 hb_initialized = False
-sensor_checking = False  #  센서 점검 중 플래그
+#  센서별 점검 중 플래그 (병렬 점검 시 각자 관리)
+led_checking = False
+buz_checking = False
+ult_checking = False
 
 # =====================
 # 상태 정의
@@ -23,6 +32,19 @@ mode = MODE_IDLE
 TRIG = DigitalPin.P1
 ECHO = DigitalPin.P2
 
+# =====================
+# 센서 점검 기준 (BLE "CFG:KEY=값" 으로 변경 가능, 허용 범위는 apply_config 참고)
+# =====================
+# 결과가 확실해지는 즉시 점검을 끝내는 순차 판정 기준
+LED_DELTA = 10      # 조도 차이가 이 이상이면 첫 사이클에서 바로 OK
+LED_CYCLES = 2      # 최대 on/off 사이클
+BUZ_LEVEL = 15      # 소리 크기가 이 이상이면 즉시 OK
+BUZ_TRIES = 3       # 최대 재생 횟수
+BUZ_SAMPLES = 6     # 재생 1회당 최대 측정 횟수 (100ms 간격)
+ULT_NEED = 2        # 유효 에코가 이 개수가 되면 즉시 OK
+ULT_TRIES = 3       # 최대 측정 횟수
+ULT_GAP = 100       # 측정 간격 (ms, HC-SR04 최소 60ms)
+
 # =====================
 # BLE 수신
 # =====================
@@ -34,9 +56,12 @@ def on_uart_data():
         serial.delimiters(Delimiters.NEW_LINE)
     ).strip()
 
-    if cmd == "HB":
+    if len(cmd) > 0:
+        #  HB뿐 아니라 어떤 명령이든 받으면 링크 정상
         last_hb_time = control.millis()
         hb_initialized = True
+
+    if cmd == "HB":
         #  HB 신호 받으면 LED 끄기 (정상 상태)
         if mode == MODE_IDLE:
             basic.clear_screen()
@@ -47,14 +72,19 @@ def on_uart_data():
         check_buzzer()
     elif cmd == "ULT":
         check_ultrasonic()
+    elif cmd == "CHK:ALL":
+        check_all_parallel()
+    elif cmd[:4] == "CFG:":
+        apply_config(cmd[4:])
     elif cmd == "CMD:DRIVE_START":
-        if sensor_checking:
+        if is_sensor_checking():
             return
         drive_start_time = control.millis()
         line_lost_count = 0
         searching_for_line = False
         drive_success = False
         last_motor_time = 0
+        tel_reset()
         mode = MODE_DRIVE
         # 주행 시작 전 라인 확인
         basic.pause(100)
@@ -89,31 +119,130 @@ def send(msg: str):
     bluetooth.uart_write_string(msg + "\n")
 
 def motor_stop():
+    global motor_l, motor_r
     maqueen.motor_stop(maqueen.Motors.ALL)
+    motor_l = 0
+    motor_r = 0
 
 def motor_forward(l, r):
+    global motor_l, motor_r
     maqueen.motor_run(maqueen.Motors.M1, maqueen.Dir.CW, l)
     maqueen.motor_run(maqueen.Motors.M2, maqueen.Dir.CW, r)
+    motor_l = l
+    motor_r = r
 
 def motor_turn_left(speed):
-    maqueen.motor_run(maqueen.Motors.M1, maqueen.Dir.CW, 0)
-    maqueen.motor_run(maqueen.Motors.M2, maqueen.Dir.CW, speed)
+    motor_forward(0, speed)
 
 def motor_turn_right(speed):
-    maqueen.motor_run(maqueen.Motors.M1, maqueen.Dir.CW, speed)
-    maqueen.motor_run(maqueen.Motors.M2, maqueen.Dir.CW, 0)
+    motor_forward(speed, 0)
 
 
 # =====================
 # 센서 점검
 # =====================
+def set_hb_interval(value):
+    global HB_INTERVAL, HB_TIMEOUT, DRIVE_HB_TIMEOUT
+    if value < 200:
+        value = 200
+    if value > HB_INTERVAL_MAX:
+        value = HB_INTERVAL_MAX
+    HB_INTERVAL = value
+    HB_TIMEOUT = value * 5 // 2
+    DRIVE_HB_TIMEOUT = value * 5
+    if DRIVE_HB_TIMEOUT < DRIVE_HB_MIN:
+        DRIVE_HB_TIMEOUT = DRIVE_HB_MIN
+    if DRIVE_HB_TIMEOUT > DRIVE_HB_MAX:
+        DRIVE_HB_TIMEOUT = DRIVE_HB_MAX
+    return value
+
+
+def is_number(text: str):
+    # 0 이상의 정수만 허용 (int()는 숫자가 아니면 NaN/0 이 되어 기준이 조용히 바뀜)
+    if len(text) == 0 or len(text) > 6:
+        return False
+    for i in range(len(text)):
+        if text[i] < "0" or text[i] > "9":
+            return False
+    return True
+
+
+def in_range(value: number, low: number, high: number):
+    return low <= value and value <= high
+
+
+def apply_config(body: str):
+    global LED_DELTA, LED_CYCLES, BUZ_LEVEL, BUZ_TRIES, BUZ_SAMPLES
+    global ULT_NEED, ULT_TRIES, ULT_GAP
+
+    parts = body.split("=")
+    if len(parts) != 2:
+        send("CFG:ERR:" + body)
+        return
+    key = parts[0]
+    if not is_number(parts[1]):
+        send("CFG:ERR:" + key)
+        return
+    value = int(parts[1])
+
+    # 범위를 벗어나면 CFG:ERR (0 이면 점검이 항상 통과/실패하므로 모두 1 이상)
+    # app.py CONFIG_LIMITS 와 같은 범위
+    if key == "LED_DELTA" and in_range(value, 1, 255):
+        LED_DELTA = value
+    elif key == "LED_CYCLES" and in_range(value, 1, 5):
+        LED_CYCLES = value
+    elif key == "BUZ_LEVEL" and in_range(value, 1, 255):
+        BUZ_LEVEL = value
+    elif key == "BUZ_TRIES" and in_range(value, 1, 5):
+        BUZ_TRIES = value
+    elif key == "BUZ_SAMPLES" and in_range(value, 1, 20):
+        BUZ_SAMPLES = value
+    elif key == "ULT_NEED" and in_range(value, 1, ULT_TRIES):
+        ULT_NEED = value
+    elif key == "ULT_TRIES" and in_range(value, ULT_NEED, 10):
+        ULT_TRIES = value
+    elif key == "ULT_GAP" and in_range(value, 60, 1000):
+        ULT_GAP = value
+    elif key == "HB_INTERVAL":
+        # 실제 적용한 간격(범위 제한 후)을 돌려줌 (20바이트 알림 1개에 들어가도록 짧게)
+        send("CFG:HB=" + str(set_hb_interval(value)))
+        return
+    else:
+        send("CFG:ERR:" + key)
+        return
+    send("CFG:OK:" + key)
+
+
+def is_sensor_checking():
+    return led_checking or buz_checking or ult_checking
+
+
+def check_all_parallel():
+    #  서로 간섭하지 않는 점검(조도 / 소리 / 초음파)을 동시에 실행
+    #  각 점검은 끝나는 즉시 자기 RESULT 를 전송
+    #  점검 중 표시는 백그라운드 시작 전에 모두 설정 (시작 전에 온 명령/HB 판정이 점검 중으로 보도록)
+    global led_checking, buz_checking, ult_checking
+    start_led = not led_checking
+    start_buz = not buz_checking
+    start_ult = not ult_checking
+    led_checking = True
+    buz_checking = True
+    ult_checking = True
+    if start_led:
+        control.in_background(check_led)
+    if start_buz:
+        control.in_background(check_buzzer)
+    if start_ult:
+        control.in_background(check_ultrasonic)
+
+
 def check_led():
-    global sensor_checking
-    sensor_checking = True
+    global led_checking
+    led_checking = True
 
     success_count = 0
 
-    for attempt in range(2):
+    for attempt in range(LED_CYCLES):
         basic.clear_screen()
         basic.pause(600)
         off_light = input.light_level()
@@ -131,10 +260,14 @@ def check_led():
         if on_light >= off_light:
             success_count += 1
 
+        #  변화가 충분히 크면 더 볼 필요 없음
+        if on_light - off_light >= LED_DELTA:
+            break
+
         basic.pause(400)
 
     basic.clear_screen()
-    sensor_checking = False
+    led_checking = False
 
     if success_count >= 1:
         send("RESULT:LED:OK")
@@ -144,37 +277,30 @@ def check_led():
 
 
 def check_buzzer():
-    global sensor_checking
-    sensor_checking = True  #  센서 점검 시작
+    global buz_checking
+    buz_checking = True  #  센서 점검 시작
     detected = False
 
-    for _ in range(3):
+    for _ in range(BUZ_TRIES):
         pins.analog_set_pitch_pin(AnalogPin.P0)
         pins.analog_pitch(1000, 1000)
 
-        basic.pause(200)
-        s1 = input.sound_level()
-        basic.pause(200)
-        s2 = input.sound_level()
-        basic.pause(200)
-        s3 = input.sound_level()
+        #  기준 이상의 소리가 처음 측정되는 즉시 종료
+        for sample in range(BUZ_SAMPLES):
+            basic.pause(100)
+            if input.sound_level() >= BUZ_LEVEL:
+                detected = True
+                break
 
         pins.analog_pitch(0, 0)
         pins.digital_write_pin(DigitalPin.P0, 0)
 
-        mx = s1
-        if s2 > mx:
-            mx = s2
-        if s3 > mx:
-            mx = s3
-
-        if mx >= 15:
-            detected = True
+        if detected:
             break
 
         basic.pause(500)
 
-    sensor_checking = False  # 센서 점검 완료
+    buz_checking = False  # 센서 점검 완료
     
     if detected:
         send("RESULT:BUZ:OK")
@@ -182,11 +308,11 @@ def check_buzzer():
         send("RESULT:BUZ:DEFECT")
 
 def check_ultrasonic():
-    global sensor_checking
-    sensor_checking = True  #  센서 점검 시작
+    global ult_checking
+    ult_checking = True  #  센서 점검 시작
     valid = 0
 
-    for _ in range(3):
+    for attempt in range(ULT_TRIES):
         pins.digital_write_pin(TRIG, 0)
         control.wait_micros(2)
         pins.digital_write_pin(TRIG, 1)
@@ -199,11 +325,16 @@ def check_ultrasonic():
             if 2 <= dist <= 400:
                 valid += 1
 
-        basic.pause(600)
+        #  필요한 에코 수를 채웠거나, 남은 측정으로 채울 수 없으면 종료
+        remaining = ULT_TRIES - attempt - 1
+        if valid >= ULT_NEED or valid + remaining < ULT_NEED:
+            break
+
+        basic.pause(ULT_GAP)
 
-    sensor_checking = False  #  센서 점검 완료
+    ult_checking = False  #  센서 점검 완료
     
-    if valid >= 2:
+    if valid >= ULT_NEED:
         send("RESULT:ULT:OK")
     else:
         send("RESULT:ULT:DEFECT")
@@ -216,6 +347,68 @@ line_lost_count = 0
 drive_success = False
 searching_for_line = False  # 라인 찾기 모드 플래그
 last_motor_time = 0
+motor_l = 0  # 마지막 좌 모터 명령 (텔레메트리용)
+motor_r = 0  # 마지막 우 모터 명령 (텔레메트리용)
+
+# =====================
+# 주행 텔레메트리
+# =====================
+# 프레임 시작 2바이트: 0xFE(텍스트에 나오지 않는 바이트) / 뒤따르는 길이
+# 헤더 4바이트: seq / 샘플 수 / 배치 시작 시각(u16, 주행 시작 기준 ms)
+# 샘플 4바이트: dt(ms) / flags(좌센서 | 우센서<<1 | lost<<2) / 좌 모터 / 우 모터
+# 배치를 바이너리 그대로 전송 (hex 문자열 대비 전송량 절반, 8샘플 = 38바이트)
+TEL_MARK = 0xFE
+TEL_HEAD = 6
+TEL_BATCH = 8  # 약 0.3초마다 전송
+tel_buf = pins.create_buffer(TEL_HEAD + TEL_BATCH * 4)
+tel_buf.set_number(NumberFormat.UINT8_LE, 0, TEL_MARK)
+tel_count = 0
+tel_seq = 0
+tel_last_time = 0
+
+def tel_reset():
+    global tel_count, tel_seq, tel_last_time
+    tel_count = 0
+    tel_seq = 0
+    tel_last_time = control.millis()
+
+def tel_sample():
+    global tel_count, tel_last_time
+    now = control.millis()
+    dt = now - tel_last_time
+    if tel_count == 0:
+        # 배치 첫 샘플은 헤더의 시작 시각을 기준으로 함
+        tel_buf.set_number(NumberFormat.UINT16_LE, 4, now - drive_start_time)
+        dt = 0
+    if dt > 255:
+        dt = 255
+    tel_last_time = now
+
+    lost = line_lost_count
+    if lost > 63:
+        lost = 63
+    flags = maqueen.read_patrol(maqueen.Patrol.PATROL_LEFT) + maqueen.read_patrol(maqueen.Patrol.PATROL_RIGHT) * 2 + lost * 4
+
+    offset = TEL_HEAD + tel_count * 4
+    tel_buf.set_number(NumberFormat.UINT8_LE, offset, dt)
+    tel_buf.set_number(NumberFormat.UINT8_LE, offset + 1, flags)
+    tel_buf.set_number(NumberFormat.UINT8_LE, offset + 2, motor_l)
+    tel_buf.set_number(NumberFormat.UINT8_LE, offset + 3, motor_r)
+    tel_count += 1
+
+    if tel_count >= TEL_BATCH:
+        tel_flush()
+
+def tel_flush():
+    global tel_count, tel_seq
+    if tel_count == 0:
+        return
+    tel_buf.set_number(NumberFormat.UINT8_LE, 1, 4 + tel_count * 4)
+    tel_buf.set_number(NumberFormat.UINT8_LE, 2, tel_seq)
+    tel_buf.set_number(NumberFormat.UINT8_LE, 3, tel_count)
+    bluetooth.uart_write_buffer(tel_buf.slice(0, TEL_HEAD + tel_count * 4))
+    tel_seq = (tel_seq + 1) % 256
+    tel_count = 0
 
 def line_trace_step():
     global line_lost_count, searching_for_line, last_motor_time, drive_success
@@ -292,8 +485,8 @@ def line_trace_step():
 while True:
     if mode != MODE_DRIVE:
         #  센서 점검 중이면 LED 제어 안 함 (점검 중단 방지)
-        if not sensor_checking:
-            #  HB 타임아웃 체크: 끊겼을 때만 NO 아이콘 표시
+        if not is_sensor_checking():
+            #  수신 타임아웃 체크: 끊겼을 때만 NO 아이콘 표시
             if control.millis() - last_hb_time > HB_TIMEOUT:
                 motor_stop()
                 mode = MODE_IDLE
@@ -307,8 +500,9 @@ while True:
                 
     if mode == MODE_DRIVE:
         line_trace_step()
-        if hb_initialized and control.millis() - last_hb_time > 5000:
-            # 5초 이상 HB가 없으면 주행 종료
+        tel_sample()
+        if hb_initialized and control.millis() - last_hb_time > DRIVE_HB_TIMEOUT:
+            # 협상한 간격 기준으로 오래 수신이 없으면 주행 종료 (기본 5초)
             motor_stop()
             mode = MODE_IDLE
             basic.clear_screen()  #  주행 종료 시 LED 끄기
@@ -319,6 +513,7 @@ while True:
                 line_left = maqueen.read_patrol(maqueen.Patrol.PATROL_LEFT)
                 line_right = maqueen.read_patrol(maqueen.Patrol.PATROL_RIGHT)
 
+                tel_flush()  # 결과 전에 남은 텔레메트리 전송
                 if drive_success:
                     motor_stop()
                     send("RESULT:DRIVE:SUCCESS")
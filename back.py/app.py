@@ -2,8 +2,17 @@ import asyncio
 import json
 import signal
 import sys
-import paho.mqtt.client as mqtt
+import threading
+import time
 import bluetooth_manager as bt
+import ble_registry
+import link_monitor
+import loop_monitor
+import station_topics
+import station_log
+import traffic_trace
+import result_store
+import telemetry  # numpy 로딩을 시작할 때 끝내서 첫 주행 결과 때 이벤트 루프가 멈추지 않도록
 
 # =====================
 # MQTT 설정
@@ -11,19 +20,79 @@ import bluetooth_manager as bt
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 
+# 명령 토픽은 원래 이름으로 비교 (STATION_ID 가 있으면 stations/<ID>/ 아래에서 수신)
+# 결과 토픽은 station_topics.out() 으로 이 스테이션 아래에 발행
+
 TOPIC_SENSOR_CONTROL = "ult01"
-TOPIC_SENSOR_RESULT  = "sensor/result"
+TOPIC_SENSOR_RESULT  = station_topics.out("sensor/result")
 
 TOPIC_DRIVE_CONTROL  = "ult02"
 TOPIC_DRIVE_STOP     = "drive/stop"  
-TOPIC_DRIVE_RESULT   = "sensor/result"
+TOPIC_DRIVE_RESULT   = station_topics.out("sensor/result")
+TOPIC_DRIVE_EVENT    = station_topics.out("drive/event")  # 실제 주행 시작/종료 (카메라 영상 녹화용)
+
+TOPIC_SENSOR_CONFIG  = "sensor/config"  # 점검 기준 변경 {"LED_DELTA": 10, ...}
+TOPIC_SENSOR_CONFIG_RESULT = station_topics.out("sensor/config/result")  # 기준별 적용 결과 (micro:bit CFG:OK / CFG:ERR)
+CONFIG_ACK_TIMEOUT = 2.0  # 기준 하나당 micro:bit 응답 대기 (초)
+# 변경 가능한 점검 기준과 허용 범위 (Rccar.py apply_config 와 같은 범위)
+CONFIG_LIMITS = {
+    "LED_DELTA": (1, 255),
+    "LED_CYCLES": (1, 5),
+    "BUZ_LEVEL": (1, 255),
+    "BUZ_TRIES": (1, 5),
+    "BUZ_SAMPLES": (1, 20),
+    "ULT_NEED": (1, 10),   # ULT_TRIES 이하인지는 micro:bit에서 확인
+    "ULT_TRIES": (1, 10),
+    "ULT_GAP": (60, 1000),  # ms (HC-SR04 최소 측정 간격)
+}
+
+TOPIC_STORE_QUERY    = "store/query"     # 로컬 결과 조회 요청 {"id": ..., "query": ...}
+TOPIC_STORE_RESPONSE = station_topics.out("store/response")  # 조회 결과 (같은 id로 응답)
+
+TOPIC_STATUS         = station_topics.out("station/status")  # 스테이션 상태 / 작업 가능 여부 (retain)
+
+TOPIC_BLE_DEVICES    = station_topics.out("ble/devices")     # 새로 발견된 micro:bit 알림
+TOPIC_BLE_CONNECT    = "ble/connect"     # 연결 대상 변경 {"address": "FD:38:..."}
+
+BLE_RETRY_DELAY = 30  # BLE 연결 실패 후 재시도 대기 (초)
+
+TOPIC_BLE_LINK       = station_topics.out("ble/link")        # 링크 품질 (점수, 지연 백분위, 실패율, 알림 간격)
+
+LINK_PUBLISH_INTERVAL = 5   # 링크 품질 발행 주기 (초)
+LINK_MIN_SCORE = 60         # 주행 전 최소 링크 점수 (미만이면 재연결 시도)
+
+TOPIC_LOOP_STATS     = station_topics.out("station/loop")            # 이벤트 루프 지연 / 느린 콜백 (5초마다)
+TOPIC_PROFILE        = "station/profile"         # 프로파일링 제어 {"command": "cprofile_start"}
+TOPIC_PROFILE_RESULT = station_topics.out("station/profile/result")  # 제어 결과 (저장한 파일 경로)
+
+TOPIC_JOB_REJECTED   = station_topics.out("station/job")  # 처리하지 못한 점검/주행 명령 알림 (사유, 되돌려 보냈는지)
+TOPIC_POOL_HOLD      = station_topics.pool_topic(station_topics.station_name())  # 이 스테이션의 대기 상태 (retain)
+JOB_MAX_REQUEUE = 3    # 바쁜 스테이션이 같은 명령을 그룹에 되돌려 보내는 최대 횟수
+HOLD_TIMEOUT = 120     # 점검을 끝낸 차량의 주행 명령을 기다리는 최대 시간 (초, 넘으면 대기열에서 빠짐)
+
+# =====================
+# 점검 모드
+# =====================
+# True: LED / 스피커 / 초음파를 micro:bit에서 동시에 점검 (CHK:ALL)
+# False: 한 장치씩 순서대로 점검
+PARALLEL_CHECK = True
+PARALLEL_CHECK_TIMEOUT = 20
 
 # =====================
 # 상태 플래그
 # =====================
 checking_in_progress = False
+config_in_progress = False  # 점검 기준 적용 중 (micro:bit 응답 대기)
 drive_requested = False
 drive_running = False  
+ble_status = "idle"  # idle / connecting / connected / failed
+ble_task = None
+pool_joined = False  # 공유 구독(작업 분산 그룹)에 참여 중인지
+holding_car = False  # 점검을 끝낸 차량이 주행 명령을 기다리는 중 (그룹 모드)
+hold_deadline = 0.0
+pool_checked_at = None  # 그룹 대기열에 올린 점검 완료 시각 (주행을 맡거나 대기를 끝내면 None)
+drive_queue = {}     # 그룹 대기열 {스테이션 이름: 점검 완료 시각} (retain 으로 복구, MQTT 콜백 스레드에서만 변경)
+pool_lock = threading.Lock()  # 공유 구독 참여/탈퇴 (MQTT 콜백 스레드와 이벤트 루프에서 호출)
 
 # =====================
 # RESULT 파싱
@@ -160,7 +229,7 @@ async def wait_for_result(device_filter=None, timeout=10.0):
                 seen_messages.add(msg)
                 # 디버그: 받은 메시지 출력 (한 번만)
                 if msg.strip() and not msg.strip().startswith("HB"):
-                    print(f" 수신 메시지: {msg.strip()}")
+                    station_log.log_sampled("app.wait_result", f" 수신 메시지: {msg.strip()}", "INFO")
                 all_messages += msg
         
         # 모든 메시지를 하나로 합쳐서 완전한 메시지 찾기
@@ -187,63 +256,185 @@ async def wait_for_result(device_filter=None, timeout=10.0):
     return None
 
 
+# =====================
+# 결과 전송 + 로컬 기록
+# =====================
+def publish_result(topic, payload, started=None):
+    """
+    결과를 MQTT로 전송하고 로컬 저장소에 기록
+
+    Args:
+        topic (str): 발행 토픽
+        payload (dict): {"device": ..., "result": ...}
+        started (float): 명령 전송 시각 (time.monotonic), 소요 시간 계산용
+    """
+    duration_ms = (time.monotonic() - started) * 1000 if started else None
+    if station_topics.STATION_GROUP:
+        # 작업 분산 중에는 어느 스테이션이 처리했는지 함께 전송
+        payload = {**payload, "station": station_topics.station_name()}
+    mqtt_client.publish(topic, json.dumps(payload))
+    try:
+        result_store.record(
+            payload["device"],
+            payload["result"],
+            duration_ms=duration_ms,
+            detail=payload.get("diagnosis")
+        )
+    except Exception as e:
+        print(f"❌ 결과 기록 오류: {e}")
+
+
 # =====================
 # 자동 점검
 # =====================
 async def auto_check():
+    """
+    점검 실행 (checking_in_progress 는 명령 수신 시 claim_check() 에서 이미 설정)
+    오류가 나도 finish_check() 로 작업 중 표시를 해제해서 스테이션이 멈추지 않음
+    """
+    try:
+        await asyncio.sleep(1.5)
+        link_monitor.set_expect_traffic(True)
+        try:
+            result_store.new_car()
+        except Exception as e:
+            print(f"❌ 차량 등록 오류: {e}")  # 결과는 MQTT로 그대로 전송
+
+        if PARALLEL_CHECK:
+            await auto_check_parallel()
+            return
+
+        for cmd in ["BUZ", "ULT", "LED"]:
+            timeout = 20 if cmd == "LED" else 10
+            started = time.monotonic()
+            result = await send_and_wait(cmd, timeout=timeout)  # LED 3번 점검을 위해 타임아웃 증가
+
+            if result:
+                publish_result(result["topic"], result["payload"], started)
+            else:
+                # timeout 시에도 백엔드 형식으로 변환
+                device_map = {"BUZ": "BUZZER", "ULT": "ULTRASONIC"}
+                backend_device = device_map.get(cmd, cmd)
+                publish_result(
+                    TOPIC_SENSOR_RESULT,
+                    {
+                        "device": backend_device,
+                        "result": "timeout"
+                    },
+                    started
+                )
+
+            await asyncio.sleep(0.3)
+    except Exception as e:
+        print(f"❌ 점검 오류: {e}")
+    finally:
+        finish_check()
+
+
+def claim_check():
+    """
+    점검 명령을 받은 즉시 작업 중으로 표시하고 공유 구독 해제 (MQTT 콜백 스레드, await 전)
+    → 점검 시작 대기 중에 다른 점검 명령이 이 스테이션으로 오지 않음
+    """
     global checking_in_progress
-    await asyncio.sleep(1.5)
     checking_in_progress = True
+    publish_status()
 
-    for cmd in ["BUZ", "ULT", "LED"]:
-        timeout = 20 if cmd == "LED" else 10
-        result = await send_and_wait(cmd, timeout=timeout)  # LED 3번 점검을 위해 타임아웃 증가
-
-        if result:
-            mqtt_client.publish(
-                result["topic"],
-                json.dumps(result["payload"])
-            )
-        else:
-            # timeout 시에도 백엔드 형식으로 변환
-            device_map = {"BUZ": "BUZZER", "ULT": "ULTRASONIC"}
-            backend_device = device_map.get(cmd, cmd)
-            mqtt_client.publish(
-                TOPIC_SENSOR_RESULT,
-                json.dumps({
-                    "device": backend_device,
-                    "result": "timeout"
-                })
-            )
-
-        await asyncio.sleep(0.3)
 
+def finish_check():
+    """점검 종료 (그룹 모드에서는 이 차량의 주행 명령을 받을 때까지 새 점검을 받지 않음)"""
+    global checking_in_progress, holding_car, hold_deadline, pool_checked_at
+    if station_topics.STATION_GROUP:
+        holding_car = True
+        hold_deadline = time.monotonic() + HOLD_TIMEOUT
+        pool_checked_at = time.time()
+        publish_pool_hold()
     checking_in_progress = False
+    publish_status()
+    link_monitor.set_expect_traffic(False)
     print("✅ 자동 점검 완료")
 
 
+async def auto_check_parallel(timeout=PARALLEL_CHECK_TIMEOUT):
+    """
+    세 장치를 동시에 점검하고 결과가 도착하는 순서대로 전송
+
+    Args:
+        timeout (float): 전체 점검 타임아웃 (초)
+    """
+    pending = {"LED", "BUZZER", "ULTRASONIC"}
+
+    bt.clear_received_messages()
+    started = time.monotonic()
+    sent = await bt.send_command("CHK:ALL")
+
+    seen_messages = set()  # 이미 본 메시지 추적
+    limit = int(timeout / 0.1) if sent else 0
+
+    for _ in range(limit):
+        for msg in bt.get_received_messages():
+            if msg in seen_messages:
+                continue
+            seen_messages.add(msg)
+
+            for line in msg.split("\n"):
+                parsed = parse_result(line.strip())
+                if not parsed or parsed["payload"]["device"] not in pending:
+                    continue
+                # 끝난 점검부터 바로 전송
+                pending.discard(parsed["payload"]["device"])
+                publish_result(parsed["topic"], parsed["payload"], started)
+
+        if not pending:
+            break
+        await asyncio.sleep(0.1)
+
+    # 응답이 없는 장치는 timeout 처리
+    for device in sorted(pending):
+        publish_result(
+            TOPIC_SENSOR_RESULT,
+            {
+                "device": device,
+                "result": "timeout"
+            },
+            started
+        )
+    bt.clear_received_messages()
+
+
 # =====================
 # 주행 처리
 # =====================
 async def drive_sequence():
     global drive_running
     drive_running = True
+    publish_status()
     print("▶ 주행 시작")
     bt.clear_received_messages()
+    bt.clear_telemetry_frames()
     print("⏳ 10초 대기 중...")
-    await asyncio.sleep(10)
+    started_wait = time.monotonic()
+    # 대기 시간 동안 링크 품질 확인 (나쁘면 주행 전에 미리 재연결)
+    await ensure_link_for_drive()
+    await asyncio.sleep(max(0.0, 10 - (time.monotonic() - started_wait)))
+    link_monitor.set_expect_traffic(True)
     
+    started = time.monotonic()
+    publish_drive_event("start")
     success = await bt.send_command("CMD:DRIVE_START")
     
     if not success:
         print("❌ 주행 명령 전송 실패 (블루투스 연결 확인 필요)")
         drive_running = False
-        mqtt_client.publish(
+        release_car()
+        publish_drive_event("end", result="DEFECT")
+        publish_status()
+        publish_result(
             TOPIC_DRIVE_RESULT,
-            json.dumps({
+            {
                 "device": "WHEEL",
                 "result": "DEFECT"
-            })
+            }
         )
         return
     
@@ -254,22 +445,100 @@ async def drive_sequence():
     result = await wait_for_result(device_filter="WHEEL", timeout=20)
 
     if result:
+        # 주행 중 수신한 텔레메트리로 바퀴 상태 등급 진단 (진단 오류로 주행 결과를 잃지 않도록)
+        try:
+            diagnosis = telemetry.analyze(bt.get_telemetry_frames())
+        except Exception as e:
+            print(f"❌ 텔레메트리 진단 오류: {e}")
+            diagnosis = None
+        if diagnosis:
+            result["payload"]["diagnosis"] = diagnosis
         print(f"✅ 주행 응답 수신: {result['payload']}")
-        mqtt_client.publish(
-            result["topic"],
-            json.dumps(result["payload"])
-        )
+        publish_drive_event("end", result=result["payload"]["result"])
+        publish_result(result["topic"], result["payload"], started)
     else:
         print("  주행 응답 없음 (timeout)")
-        mqtt_client.publish(
+        publish_drive_event("end", result="timeout")
+        publish_result(
             TOPIC_DRIVE_RESULT,
-            json.dumps({
+            {
                 "device": "WHEEL",
                 "result": "timeout"
-            })
+            },
+            started
         )
     
+    link_monitor.set_expect_traffic(False)
     drive_running = False
+    release_car()
+    publish_status()
+
+def publish_drive_event(event, **extra):
+    """주행 시작/종료 알림 (camera.py가 이 구간을 영상으로 녹화)"""
+    try:
+        car_id = result_store.current_car()
+    except Exception as e:
+        print(f"❌ 차량 조회 오류: {e}")
+        car_id = None
+    mqtt_client.publish(TOPIC_DRIVE_EVENT, json.dumps({
+        "event": event,
+        "car_id": car_id,
+        "timestamp": time.time(),
+        **extra
+    }))
+
+
+async def ensure_link_for_drive():
+    """
+    주행 전 링크 점검
+    점수가 기준 미만이면 재연결 (주행 중 링크 끊김으로 micro:bit가 주행을 중단하는 것 방지)
+
+    Returns:
+        bool: 주행 가능한 링크 여부
+    """
+    health = bt.link_health()
+    if bt.is_connected() and health["score"] >= LINK_MIN_SCORE:
+        return True
+
+    print(f"⚠️ 링크 품질 낮음 (점수 {health['score']}) - 주행 전 재연결")
+    mqtt_client.publish(TOPIC_BLE_LINK, json.dumps({
+        **health,
+        "warning": "poor link before drive, reconnecting"
+    }))
+
+    if ble_task and not ble_task.done():
+        ble_task.cancel()
+    await bt.disconnect()
+    set_ble_status("connecting")
+    if await bt.connect(max_retries=2):
+        set_ble_status("connected")
+        return True
+
+    set_ble_status("failed")
+    mqtt_client.publish(TOPIC_BLE_LINK, json.dumps({
+        **bt.link_health(),
+        "warning": "reconnect failed, drive will likely fail"
+    }))
+    start_ble_task()
+    return False
+
+
+async def link_monitor_task():
+    """링크 품질 주기 발행 + 끊김 감지 시 재연결"""
+    while True:
+        await asyncio.sleep(LINK_PUBLISH_INTERVAL)
+        if ble_status == "connected" and not bt.is_connected():
+            print("⚠️ BLE 링크 끊김 감지 - 재연결 시작")
+            set_ble_status("disconnected")
+            await bt.disconnect()
+            start_ble_task()
+        if ble_status == "connected":
+            mqtt_client.publish(TOPIC_BLE_LINK, json.dumps(bt.link_health()))
+        if holding_car and not (drive_requested or drive_running) and time.monotonic() > hold_deadline:
+            print(f"⚠️ {HOLD_TIMEOUT}초 동안 주행 명령 없음 - 그룹 대기열에서 제외")
+            release_car()
+        publish_status()  # 작업 가능 여부 / 상태 주기 알림
+
 
 # =====================
 # 주행 중단
@@ -287,22 +556,435 @@ async def stop_drive():
         print("❌ 주행 중단 명령 전송 실패")
 
 
+# =====================
+# 점검 기준 설정
+# =====================
+def parse_sensor_config(payload):
+    """
+    점검 기준 요청 검사 (CONFIG_LIMITS 에 없는 기준이나 범위 밖 값은 micro:bit로 보내지 않음)
+
+    Returns:
+        tuple: (요청 id, 보낼 기준 {KEY: 정수}, 거절한 기준 {KEY: 사유})
+    """
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, {}, {"*": "invalid json object"}
+
+    request_id = data.pop("id", None)
+    config, rejected = {}, {}
+    for key, value in data.items():
+        key = str(key).upper()
+        if key not in CONFIG_LIMITS:
+            rejected[key] = "unknown key"
+            continue
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        low, high = CONFIG_LIMITS[key]
+        if isinstance(value, bool) or not isinstance(value, int):
+            rejected[key] = f"invalid value: {value!r}"
+        elif not low <= value <= high:
+            rejected[key] = f"out of range: {low}..{high}"
+        else:
+            config[key] = value
+    return request_id, config, rejected
+
+
+def publish_config_result(request_id, results):
+    mqtt_client.publish(TOPIC_SENSOR_CONFIG_RESULT, json.dumps({
+        "id": request_id,
+        "ok": bool(results) and all(r == "ok" for r in results.values()),
+        "results": results,
+        "timestamp": time.time()
+    }))
+
+
+async def apply_sensor_config(request_id, config, rejected):
+    """
+    센서 점검 기준을 micro:bit로 전송 (CFG:KEY=값) 하고 기준별 응답을 발행
+
+    Args:
+        config (dict): 기준 이름과 정수 값 (예: {"LED_DELTA": 10, "ULT_NEED": 2})
+        rejected (dict): 보내지 않은 기준과 사유 (결과에 함께 포함)
+    """
+    global config_in_progress
+    results = dict(rejected)
+    try:
+        for key, value in config.items():
+            bt.clear_received_messages()
+            if not await bt.send_command(f"CFG:{key}={value}"):
+                results[key] = "send failed"
+                continue
+            results[key] = "timeout"
+            for _ in range(int(CONFIG_ACK_TIMEOUT / 0.1)):
+                msgs = bt.get_received_messages()
+                if any(f"CFG:OK:{key}" in m for m in msgs):
+                    results[key] = "ok"
+                    break
+                if any(f"CFG:ERR:{key}" in m for m in msgs):
+                    results[key] = "rejected by micro:bit"
+                    break
+                await asyncio.sleep(0.1)
+        bt.clear_received_messages()
+    finally:
+        config_in_progress = False
+        publish_status()
+    print(f"⚙️ 점검 기준 적용: {results}")
+    publish_config_result(request_id, results)
+
+
+# =====================
+# 로컬 결과 조회
+# =====================
+def handle_store_query(client, payload):
+    """조회 요청을 처리하고 같은 id로 응답 (MQTT 콜백 스레드에서 바로 처리)"""
+    request = {}
+    try:
+        request = json.loads(payload)
+        response = result_store.query(request)
+    except Exception as e:
+        response = {"error": str(e)}
+    response["id"] = request.get("id") if isinstance(request, dict) else None
+    client.publish(TOPIC_STORE_RESPONSE, json.dumps(response))
+
+
+# =====================
+# 스테이션 상태 / BLE 연결
+# =====================
+def job_active():
+    """점검/기준 적용/주행 중 (micro:bit 응답을 기다리는 작업이 있음)"""
+    return checking_in_progress or config_in_progress or drive_requested or drive_running
+
+
+def is_busy():
+    """작업 중이거나 점검을 끝낸 차량의 주행을 기다리는 중"""
+    return job_active() or holding_car
+
+
+def status_payload(ble):
+    busy = is_busy()
+    ready = ble == "connected"
+    payload = {
+        "station": station_topics.station_name(),
+        "group": station_topics.STATION_GROUP,
+        "ble": ble,
+        "ready": ready,
+        "busy": busy,
+        "capacity": 1 if ready and not busy else 0,  # 지금 받을 수 있는 작업 수
+        "timestamp": time.time()
+    }
+    if ready:
+        payload["link_score"] = bt.link_health()["score"]
+    return json.dumps(payload)
+
+
+def publish_status():
+    """현재 상태 / 작업 가능 여부 알림 (retain) + 작업 분산 그룹 참여 갱신"""
+    update_pool_membership()
+    mqtt_client.publish(TOPIC_STATUS, status_payload(ble_status), retain=True)
+
+
+def set_ble_status(status):
+    """BLE 상태 변경 후 백엔드에 알림 (retain)"""
+    global ble_status
+    ble_status = status
+    publish_status()
+
+
+def update_pool_membership():
+    """
+    작업을 받을 수 있을 때만 공유 구독에 참여
+    (연결이 끊겼거나 점검/주행 중이면 구독을 해제해서 브로커가 다른 스테이션에 명령을 전달)
+    """
+    global pool_joined
+    if not station_topics.STATION_GROUP:
+        return
+    with pool_lock:
+        available = bt.is_connected() and not is_busy()
+        if available == pool_joined:
+            return
+
+        filters = [station_topics.shared(TOPIC_SENSOR_CONTROL)]  # 주행 명령은 그룹 대기열 순서로 처리
+        if available:
+            mqtt_client.subscribe([(f, 0) for f in filters])
+            print(f"🤝 작업 그룹 참여: {station_topics.STATION_GROUP}")
+        else:
+            mqtt_client.unsubscribe(filters)
+            print(f"⏸️ 작업 그룹 잠시 탈퇴 (BLE {ble_status}, 작업 중: {is_busy()})")
+        pool_joined = available
+
+
+# =====================
+# 그룹 대기열 / 거절한 작업
+# =====================
+def publish_pool_hold():
+    """
+    이 스테이션의 대기 상태를 retain 으로 발행 (대기 중이면 점검 완료 시각, 아니면 빈 메시지로 삭제)
+    → 재시작/재연결한 스테이션도 구독 즉시 같은 대기열을 받음
+    """
+    if not station_topics.STATION_GROUP:
+        return
+    payload = "" if pool_checked_at is None else json.dumps({
+        "station": station_topics.station_name(),
+        "checked_at": pool_checked_at
+    })
+    mqtt_client.publish(TOPIC_POOL_HOLD, payload, qos=1, retain=True)
+
+
+def handle_pool_hold(station, payload):
+    """스테이션(자신 포함)의 대기 상태 반영 → 모든 스테이션이 같은 순서의 대기열을 유지"""
+    if not payload:
+        drive_queue.pop(station, None)
+        return
+    try:
+        drive_queue[station] = float(json.loads(payload)["checked_at"])
+    except (ValueError, KeyError, TypeError):
+        print(f"❌ 그룹 대기열 형식 오류: {payload}")
+
+
+def pool_head():
+    """대기열 맨 앞 스테이션 (가장 먼저 점검을 끝낸 차량, 비정상 종료로 남은 오래된 대기는 무시)"""
+    cutoff = time.time() - 2 * HOLD_TIMEOUT
+    waiting = sorted((t, station) for station, t in drive_queue.items() if t >= cutoff)
+    return waiting[0][1] if waiting else None
+
+
+def release_car():
+    """이 스테이션의 차량 대기 종료 (주행 완료 / 대기 시간 초과 / 직접 주행 명령)"""
+    global holding_car, pool_checked_at
+    holding_car = False
+    if pool_checked_at is not None:
+        pool_checked_at = None
+        publish_pool_hold()
+
+
+def take_pool_drive(msg):
+    """
+    그룹으로 온 주행 명령(true)을 대기열 맨 앞 스테이션에 배정
+    - 모든 스테이션이 맨 앞을 대기열에서 빼서 연속 주행 명령도 같은 순서로 나눠 받음
+    - 맨 앞 스테이션만 응답: 주행할 수 있으면 retain 대기 상태를 지워 확정,
+      주행할 수 없으면 거절 알림 후 대기 상태를 다시 발행 → 모든 스테이션의 대기열에 원래 순서로 돌아감
+
+    Returns:
+        bool: 이 스테이션이 주행을 맡았는지
+    """
+    global pool_checked_at
+    head = pool_head()
+    if head is None:
+        print("↩️ ult02 그룹 주행 명령 무시 (대기열에 점검을 끝낸 차량 없음)")
+        return False
+    del drive_queue[head]
+    if head != station_topics.station_name():
+        return False
+
+    if pool_checked_at is None:
+        reject_job(msg, TOPIC_DRIVE_CONTROL, "no checked car")
+        publish_pool_hold()  # 남아 있던 retain 대기 상태 삭제
+        return False
+    if not bt.is_connected() or job_active():
+        reject_job(msg, TOPIC_DRIVE_CONTROL, f"ble {ble_status}" if not bt.is_connected() else "busy")
+        publish_pool_hold()
+        return False
+
+    pool_checked_at = None  # 주행 확정 (차량은 주행이 끝날 때까지 holding_car 로 유지)
+    publish_pool_hold()
+    return True
+
+
+def reject_job(msg, topic, reason):
+    """
+    처리하지 못한 점검/주행 명령을 버리지 않고 알림
+    그룹 공유 구독으로 받은 명령은 다른 스테이션이 받도록 그룹에 되돌려 보냄 (JOB_MAX_REQUEUE 회까지)
+    """
+    count = station_topics.requeue_count(msg)
+    requeue = (
+        station_topics.STATION_GROUP is not None
+        and topic == TOPIC_SENSOR_CONTROL
+        and msg.topic == topic
+        and count < JOB_MAX_REQUEUE
+    )
+    if requeue:
+        mqtt_client.publish(topic, msg.payload, qos=1, properties=station_topics.requeue_properties(count + 1))
+    print(f"↩️ {topic} 명령 처리 불가 ({reason}){' - 그룹에 되돌려 보냄' if requeue else ''}")
+    mqtt_client.publish(TOPIC_JOB_REJECTED, json.dumps({
+        "job": topic,
+        "reason": reason,
+        "requeued": requeue,
+        "attempts": count + 1,
+        "station": station_topics.station_name(),
+        "timestamp": time.time()
+    }))
+
+
+def on_new_ble_device(address, info):
+    """새 micro:bit 발견 시 백엔드에 알림"""
+    mqtt_client.publish(TOPIC_BLE_DEVICES, json.dumps({"address": address, **info}))
+
+
+async def ble_connect_task(address=None):
+    """MQTT와 별개로 백그라운드에서 BLE 연결 (실패 시 계속 재시도)"""
+    while True:
+        set_ble_status("connecting")
+        if await bt.connect(address=address):
+            set_ble_status("connected")
+            print("✅ BLE 연결 완료")
+            return
+
+        set_ble_status("failed")
+        print(f"❌ BLE 연결 실패 ({BLE_RETRY_DELAY}초 후 재시도)")
+        await asyncio.sleep(BLE_RETRY_DELAY)
+
+
+def start_ble_task(address=None):
+    """BLE 연결 작업 시작 (진행 중인 연결 작업은 취소)"""
+    global ble_task
+    if ble_task and not ble_task.done():
+        ble_task.cancel()
+    ble_task = asyncio.create_task(ble_connect_task(address))
+
+
+async def switch_car(address):
+    """다른 micro:bit로 연결 변경 (코드 수정 없이 차량 교체)"""
+    print(f"🔄 연결 대상 변경: {address}")
+    ble_registry.pin(address)  # 재시작 후에도 이 장치에 연결
+    if ble_task and not ble_task.done():
+        ble_task.cancel()
+    await bt.disconnect()
+    start_ble_task(address)
+
+
+def handle_profile(client, payload):
+    """
+    cProfile / tracemalloc 켜고 끄기 (결과 파일은 back.py/logs/)
+    이벤트 루프 응답을 최대 CONTROL_TIMEOUT 초 기다리므로 작업 스레드에서 실행하고 결과도 거기서 발행
+    (MQTT 콜백 스레드가 멈추면 다른 명령 수신 / keepalive 도 멈춤)
+    """
+    try:
+        command = json.loads(payload)["command"]
+    except (ValueError, KeyError, TypeError):
+        command = payload  # 문자열 명령도 허용
+
+    def run():
+        result = loop_monitor.handle_control(command)
+        print(f"🔬 프로파일링 {command}: {result.get('path') or result.get('error') or 'OK'}")
+        client.publish(TOPIC_PROFILE_RESULT, json.dumps(result))
+
+    threading.Thread(target=run, name="profile-control", daemon=True).start()
+
+
+def publish_loop_stats(stats):
+    if stats["slow_count"]:
+        station_log.log(f"⚠️ 이벤트 루프 정지 {stats['slow_count']}회 (최대 지연 {stats['max_lag_ms']}ms)", "WARNING")
+    mqtt_client.publish(TOPIC_LOOP_STATS, json.dumps(stats))
+
+
 # =====================
 # MQTT 콜백
 # =====================
+def on_connect(client, userdata, flags, rc, properties=None):
+    """
+    (재)연결될 때마다 고정 토픽을 다시 구독하고 그룹 상태를 다시 맞춤
+    - 새 세션에는 공유 구독이 없으므로 참여 상태를 초기화한 뒤 다시 판단
+    - 대기열은 retain 대기 상태로 다시 받고, 이 스테이션의 대기 상태와 상태 메시지(will 로 offline 이 됐을 수 있음)를 다시 발행
+    """
+    global pool_joined
+    print(f"📡 MQTT 연결 (rc={rc})")
+    drive_queue.clear()
+    client.subscribe(station_topics.subscriptions([
+        TOPIC_DRIVE_STOP,  # ✅ 추가: 주행 중단 토픽 구독
+        TOPIC_SENSOR_CONFIG,
+        TOPIC_STORE_QUERY,
+        TOPIC_BLE_CONNECT,
+        TOPIC_PROFILE
+    ],
+        jobs=[TOPIC_SENSOR_CONTROL],  # 그룹이 있으면 작업 가능할 때 공유 구독
+        pool=[TOPIC_DRIVE_CONTROL],   # 그룹이 있으면 모두 받고 대기열 순서대로 주행
+        broadcast=[TOPIC_DRIVE_STOP]  # 주행 중단은 그룹 전체에 전달 (주행 중인 스테이션만 반응)
+    ))
+    with pool_lock:
+        pool_joined = False
+    publish_pool_hold()
+    publish_status()  # update_pool_membership 포함
+
+
 def on_message(client, userdata, msg):
-    global drive_requested
+    global drive_requested, config_in_progress
 
+    traffic_trace.record(traffic_trace.MQTT_IN, msg.topic, msg.payload)
     payload = msg.payload.decode().strip()
+    topic = station_topics.name_of(msg.topic)
 
-    if msg.topic == TOPIC_SENSOR_CONTROL and payload.lower() == "true":
-        if not checking_in_progress:
-            asyncio.run_coroutine_threadsafe(auto_check(), loop)
+    pool_station = station_topics.pool_station(msg.topic)
+    if pool_station:
+        handle_pool_hold(pool_station, payload)
+        return
 
-    if msg.topic == TOPIC_DRIVE_CONTROL and payload.lower() == "true":
+    pooled = station_topics.STATION_GROUP is not None and msg.topic == topic
+    if topic == TOPIC_DRIVE_CONTROL and pooled:
+        # 그룹 주행 명령: 모든 스테이션이 받고 대기열 맨 앞(이 차량을 점검한 스테이션)만 주행
+        if payload.lower() != "true" or not take_pool_drive(msg):
+            return
         drive_requested = True
+        publish_status()
+        return
+
+    if topic in (TOPIC_SENSOR_CONTROL, TOPIC_DRIVE_CONTROL) and not bt.is_connected():
+        # BLE 준비 전 명령은 처리하지 않고 알림 + 현재 상태를 다시 알림
+        reject_job(msg, topic, f"ble {ble_status}")
+        set_ble_status(ble_status)
+        return
+
+    if topic == TOPIC_SENSOR_CONTROL and payload.lower() == "true":
+        if is_busy():
+            reject_job(msg, topic, "busy")
+        else:
+            claim_check()
+            asyncio.run_coroutine_threadsafe(auto_check(), loop)
 
-    if msg.topic == TOPIC_DRIVE_STOP:
+    if topic == TOPIC_DRIVE_CONTROL and payload.lower() == "true":
+        if job_active():
+            reject_job(msg, topic, "busy")
+        else:
+            if pool_checked_at is not None:
+                release_car()  # 직접 주행 명령 → 그룹 대기열에서 이 스테이션 제외
+            drive_requested = True
+            publish_status()
+
+    if topic == TOPIC_SENSOR_CONFIG:
+        request_id, config, rejected = parse_sensor_config(payload)
+        if not config:
+            print(f"❌ 점검 기준 형식 오류: {payload}")
+            publish_config_result(request_id, rejected)
+        elif job_active():
+            # 점검/기준 적용/주행 응답 대기 중에는 수신 버퍼를 건드리지 않도록 적용하지 않고 알림
+            publish_config_result(request_id, {**{key: "busy" for key in config}, **rejected})
+        elif not bt.is_connected():
+            publish_config_result(request_id, {**{key: f"ble {ble_status}" for key in config}, **rejected})
+        else:
+            config_in_progress = True  # 적용이 끝날 때까지 점검/주행 명령을 받지 않음
+            publish_status()
+            asyncio.run_coroutine_threadsafe(apply_sensor_config(request_id, config, rejected), loop)
+
+    if topic == TOPIC_BLE_CONNECT:
+        try:
+            address = json.loads(payload)["address"]
+        except (ValueError, KeyError, TypeError):
+            print(f"❌ 연결 대상 형식 오류: {payload}")
+            return
+        if not is_busy():
+            asyncio.run_coroutine_threadsafe(switch_car(address), loop)
+
+    if topic == TOPIC_STORE_QUERY:
+        handle_store_query(client, payload)
+
+    if topic == TOPIC_PROFILE:
+        handle_profile(client, payload)
+
+    if topic == TOPIC_DRIVE_STOP:
+        if station_topics.STATION_ID and msg.topic == topic and not drive_running:
+            return  # 전역 주행 중단은 주행 중인 스테이션만 처리
         if payload.lower() == "true" or payload.lower() == "stop":
             print("🛑 주행 중단 요청 수신")
             asyncio.run_coroutine_threadsafe(stop_drive(), loop)
@@ -314,24 +996,24 @@ def on_message(client, userdata, msg):
 async def main():
     global mqtt_client, drive_requested
 
-    if not await bt.connect():
-        print("❌ BLE 연결 실패")
-        return
-
-    print("✅ BLE 연결 완료")
+    result_store.open_store()
+    result_store.rollup()  # 재시작 사이에 쌓인 오래된 데이터 정리
 
+    # MQTT 먼저 연결해서 BLE 연결 중에도 백엔드에서 상태 확인 가능
+    mqtt_client.will_set(TOPIC_STATUS, status_payload("offline"), retain=True)
     mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    mqtt_client.subscribe([
-        (TOPIC_SENSOR_CONTROL, 0),
-        (TOPIC_DRIVE_CONTROL, 0),
-        (TOPIC_DRIVE_STOP, 0)  # ✅ 추가: 주행 중단 토픽 구독
-    ])
-    mqtt_client.loop_start()
+    mqtt_client.loop_start()  # 구독은 연결될 때마다 on_connect 에서
+
+    ble_registry.set_new_device_handler(on_new_ble_device)
+    start_ble_task()
+    asyncio.create_task(link_monitor_task())
+    loop_monitor.start(asyncio.get_running_loop(), publish_loop_stats)
 
     print(" 시스템 대기 중...")
-    print(f" 구독 토픽: {TOPIC_SENSOR_CONTROL}, {TOPIC_DRIVE_CONTROL}, {TOPIC_DRIVE_STOP}")
-    print(f" 주행 시작 명령: mosquitto_pub -h localhost -t '{TOPIC_DRIVE_CONTROL}' -m 'true'")
-    print(f" 주행 중단 명령: mosquitto_pub -h localhost -t '{TOPIC_DRIVE_STOP}' -m 'stop'")
+    print(f" 스테이션: {station_topics.station_name()} (그룹: {station_topics.STATION_GROUP or '-'})")
+    print(f" 구독 토픽: {station_topics.out(TOPIC_SENSOR_CONTROL)}, {station_topics.out(TOPIC_DRIVE_CONTROL)}, {station_topics.out(TOPIC_DRIVE_STOP)}")
+    print(f" 주행 시작 명령: mosquitto_pub -h localhost -t '{station_topics.out(TOPIC_DRIVE_CONTROL)}' -m 'true'")
+    print(f" 주행 중단 명령: mosquitto_pub -h localhost -t '{station_topics.out(TOPIC_DRIVE_STOP)}' -m 'stop'")
 
     while True:
         if drive_requested:
@@ -347,14 +1029,22 @@ async def main():
 loop = asyncio.new_event_loop()
 asyncio.set_event_loop(loop)
 
-mqtt_client = mqtt.Client()
+mqtt_client = traffic_trace.attach_mqtt(station_topics.create_client())
+mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 
-try:
-    loop.run_until_complete(main())
-    loop.run_forever()
-except KeyboardInterrupt:
-    print("\n 종료")
-finally:
-    mqtt_client.loop_stop()
-    loop.close()
+# replay.py 에서는 import만 하고 가짜 BLE/MQTT로 실행
+if __name__ == "__main__":
+    station_log.install_dump_signal()  # kill -USR1 <pid> 로 링 버퍼 덤프
+    traffic_trace.start_from_env("app")
+
+    try:
+        loop.run_until_complete(main())
+        loop.run_forever()
+    except KeyboardInterrupt:
+        print("\n 종료")
+    finally:
+        mqtt_client.loop_stop()
+        result_store.close_store()
+        traffic_trace.stop()
+        loop.close()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+micro:bit BLE 장치 등록부
+백그라운드에서 계속 스캔하면서 micro:bit(UART 서비스 / "BBC micro:bit" 이름)를 찾아
+마지막 RSSI, 광고 데이터와 함께 디스크에 저장
+→ 최근 광고를 받은 장치는 스캔 없이 바로 연결, 새 장치는 콜백으로 알림
+→ 연결 대상은 기본 주소 또는 ble/connect 로 고정(pin)한 장치만 사용
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from bleak import BleakScanner
+
+UART_SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
+MICROBIT_NAME_PREFIX = "BBC micro:bit"
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ble_devices.json")
+SAVE_INTERVAL = 10.0   # 디스크 저장 최소 간격 (초, SD카드 쓰기 줄이기)
+FRESH_SEC = 30.0       # 이 시간 안에 광고를 받은 장치는 스캔 없이 연결
+
+# 전역 변수
+_registry = {}          # 주소 -> {"name", "rssi", "last_seen", "adv"}
+_loaded = False         # 디스크 등록부를 읽었는지 (읽기 전에 저장하면 기존 장치/고정 정보를 덮어씀)
+_devices = {}           # 주소 -> 최근 BLEDevice (이번 실행에서 본 장치)
+_scanner = None
+_last_save = 0.0
+_save_task = None       # 예약된 백그라운드 저장
+_write_lock = threading.Lock()
+_new_device_handler = None
+
+
+# =====================
+# 등록부 파일
+# =====================
+def load(path=REGISTRY_PATH):
+    """디스크에서 등록부 읽기"""
+    global _registry, _loaded
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            _registry = json.load(f)
+    except (OSError, ValueError):
+        _registry = {}
+    _loaded = True
+    return _registry
+
+
+def ensure_loaded():
+    """아직 읽지 않았으면 디스크 등록부를 읽고 그 사이 메모리에서 바뀐 장치를 덮어씀"""
+    if not _loaded:
+        changed = dict(_registry)
+        load()
+        _registry.update(changed)
+
+
+def _write(text, path):
+    """임시 파일에 쓴 뒤 교체 (이벤트 루프 / 작업 스레드에서 함께 호출)"""
+    with _write_lock:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+def save(path=REGISTRY_PATH):
+    """등록부를 디스크에 저장"""
+    global _last_save
+    ensure_loaded()
+    _write(json.dumps(_registry, ensure_ascii=False, indent=2), path)
+    _last_save = time.time()
+
+
+async def _save_after(delay):
+    """delay 초 뒤 등록부를 작업 스레드에서 저장 (SD카드 쓰기로 이벤트 루프를 막지 않도록)"""
+    global _last_save
+    await asyncio.sleep(delay)
+    ensure_loaded()
+    text = json.dumps(_registry, ensure_ascii=False, indent=2)  # 루프에서 복사본을 만든 뒤 쓰기만 넘김
+    _last_save = time.time()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _write, text, REGISTRY_PATH)
+    except OSError as e:
+        print(f"❌ 장치 등록부 저장 오류: {e}")
+
+
+def _schedule_save(delay):
+    """백그라운드 저장 예약 (이미 예약되어 있으면 그 저장에 포함)"""
+    global _save_task
+    if _save_task and not _save_task.done():
+        return
+    _save_task = asyncio.get_running_loop().create_task(_save_after(delay))
+
+
+def get_registry():
+    """등록된 장치 목록 (주소 -> 정보)"""
+    return dict(_registry)
+
+
+def set_new_device_handler(handler):
+    """새 장치 발견 시 호출할 핸들러 등록 handler(address, info)"""
+    global _new_device_handler
+    _new_device_handler = handler
+
+
+# =====================
+# 백그라운드 스캔
+# =====================
+def _is_microbit(device, adv):
+    uuids = [u.lower() for u in (adv.service_uuids or [])]
+    name = adv.local_name or device.name or ""
+    return UART_SERVICE_UUID.lower() in uuids or name.startswith(MICROBIT_NAME_PREFIX)
+
+
+def _on_detection(device, adv):
+    if not _is_microbit(device, adv):
+        return
+
+    address = device.address.upper()
+    is_new = address not in _registry
+    pinned = _registry.get(address, {}).get("pinned", False)
+    info = {
+        "name": adv.local_name or device.name,
+        "rssi": adv.rssi,
+        "last_seen": time.time(),
+        "adv": {
+            "service_uuids": adv.service_uuids,
+            "manufacturer_data": {str(k): v.hex() for k, v in adv.manufacturer_data.items()},
+            "tx_power": adv.tx_power,
+        },
+    }
+    if pinned:
+        info["pinned"] = True
+    _registry[address] = info
+    _devices[address] = device
+
+    # 스캔 콜백은 이벤트 루프에서 실행되므로 저장은 예약만 (최소 SAVE_INTERVAL 간격)
+    if is_new:
+        print(f"📡 새 micro:bit 발견: {address} ({info['name']}, RSSI {info['rssi']})")
+        _schedule_save(0)
+        if _new_device_handler:
+            _new_device_handler(address, info)
+    else:
+        _schedule_save(max(0.0, SAVE_INTERVAL - (time.time() - _last_save)))
+
+
+async def start_scan():
+    """백그라운드 스캔 시작 (이미 실행 중이면 무시)"""
+    global _scanner
+    if _scanner:
+        return
+    ensure_loaded()
+    _scanner = BleakScanner(detection_callback=_on_detection)
+    await _scanner.start()
+
+
+async def stop_scan():
+    """백그라운드 스캔 중지 (연결 시도 중에는 잠시 멈춤)"""
+    global _scanner
+    if not _scanner:
+        return
+    try:
+        await _scanner.stop()
+    except Exception:
+        pass
+    _scanner = None
+
+
+def is_scanning():
+    return _scanner is not None
+
+
+# =====================
+# 연결 대상 찾기
+# =====================
+def fresh_device(address, max_age=FRESH_SEC):
+    """
+    최근에 광고를 받은 장치 객체 (스캔 없이 바로 연결 가능)
+
+    Returns:
+        BLEDevice 또는 None
+    """
+    address = address.upper()
+    info = _registry.get(address)
+    device = _devices.get(address)
+    if device and info and time.time() - info["last_seen"] <= max_age:
+        return device
+    return None
+
+
+def pin(address):
+    """
+    이 스테이션의 연결 대상으로 고정 (등록부에 저장되어 재시작 후에도 유지)
+    """
+    ensure_loaded()  # 읽기 전에 저장하면 다른 장치 정보가 사라짐
+    address = address.upper()
+    for info in _registry.values():
+        info.pop("pinned", None)
+    entry = _registry.setdefault(address, {"name": None, "rssi": None, "last_seen": 0, "adv": {}})
+    entry["pinned"] = True
+    save()
+
+
+def preferred_address(default=None):
+    """
+    연결할 장치 주소
+    고정된 장치가 있으면 그 주소, 아니면 기본 주소
+    (가장 최근에 본 장치로 대신 연결하지 않음 - 옆 스테이션 차량일 수 있음)
+
+    Returns:
+        str: 주소 (고정된 장치가 없으면 default)
+    """
+    for address, info in _registry.items():
+        if info.get("pinned"):
+            return address
+    return default
+
+
+async def wait_for_device(address, timeout=10.0):
+    """백그라운드 스캔 결과에 장치가 나타날 때까지 대기"""
+    limit = int(timeout / 0.1)
+    for _ in range(limit):
+        device = fresh_device(address)
+        if device:
+            return device
+        await asyncio.sleep(0.1)
+    return None
@@ -4,10 +4,15 @@ Maqueen RC카 Bluetooth 연결 관리자
 micro:bit와의 블루투스 연결/해제/상태 관리를 담당
 """
 import asyncio
-import subprocess
+import time
 from bleak import BleakClient, BleakScanner
+import station_log
+import ble_registry
+import link_monitor
+import traffic_trace
 
 # micro:bit 설정
+# 기본 연결 대상 (ble/connect 로 다른 장치를 고정하면 그 장치에 연결)
 MICROBIT_ADDRESS = "FD:38:D7:56:F0:07"
 UART_SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
 # micro:bit MakeCode는 UUID를 반대로 구현함
@@ -19,6 +24,23 @@ _client = None
 _received_messages = []
 _notification_handler = None
 _hb_task = None
+_address = MICROBIT_ADDRESS  # 현재 연결 대상 주소
+HB_MAX_FAILURES = 3  # Heartbeat 연속 실패 허용 횟수 (초과 시 링크 끊김으로 판단)
+
+# 적응형 Heartbeat: micro:bit는 어떤 명령이든 받으면 링크 정상으로 판단하므로
+# 다른 쓰기가 HB_IDLE_INTERVAL 동안 없을 때만 HB 전송 (간격은 연결 시 CFG:HB_INTERVAL 로 협상)
+HB_IDLE_INTERVAL = 1.0     # 초
+HB_LEGACY_INTERVAL = 0.6   # 협상 실패 시 (이전 펌웨어) 고정 주기
+HB_NEGOTIATE_TIMEOUT = 1.5
+_hb_interval = HB_LEGACY_INTERVAL
+_hb_adaptive = False
+_last_write = 0.0          # 마지막 BLE 쓰기 시각 (명령 / HB)
+TEL_MARK = 0xFE            # 텔레메트리 바이너리 프레임 시작 바이트 (Rccar.py 와 동일, UTF-8 텍스트에 나오지 않음)
+_telemetry_frames = []     # 프레임 본문 (bytes, telemetry.decode_frame 으로 해석)
+TEL_BATCH = 8              # 프레임당 최대 샘플 수 (Rccar.py 와 동일)
+TEL_RESYNC_SEC = 0.5       # 프레임 조각 사이 최대 간격 (넘으면 받던 프레임을 버리고 다시 맞춤)
+_telemetry_pending = None  # 수신 중인(아직 다 오지 않은) TEL 프레임 (길이 바이트부터)
+_telemetry_pending_at = 0.0
 
 
 def set_notification_handler(handler):
@@ -27,12 +49,75 @@ def set_notification_handler(handler):
     _notification_handler = handler
 
 
+def _split_telemetry(raw, now=None):
+    """
+    수신 데이터에서 주행 텔레메트리 프레임(0xFE, 길이, 본문)을 분리
+
+    TEL 프레임은 20바이트 알림 여러 개에 걸쳐 나뉘어 오고 앞뒤에 일반 메시지가 붙을 수 있으므로
+    길이만큼 모아서 본문을 저장하고, 나머지(일반 메시지) 바이트만 반환
+
+    프레임 일부가 유실되어도 뒤의 메시지(RESULT:DRIVE 등)를 삼키지 않도록 다시 맞춤
+    - 헤더의 길이와 샘플 수가 맞지 않으면 잘못된 시작으로 보고 그 뒤 바이트를 일반 메시지로 다시 처리
+    - 받던 프레임의 다음 조각이 TEL_RESYNC_SEC 안에 오지 않으면 받던 바이트를 버림
+
+    Args:
+        raw (bytes): 수신 알림 데이터
+        now (float): 수신 시각 (time.monotonic, 테스트용)
+
+    Returns:
+        bytes: 텔레메트리를 제외한 나머지 바이트
+    """
+    global _telemetry_pending, _telemetry_pending_at
+    now = time.monotonic() if now is None else now
+    if _telemetry_pending is not None and now - _telemetry_pending_at > TEL_RESYNC_SEC:
+        print(f"⚠️ 텔레메트리 프레임 조각 유실 - {len(_telemetry_pending)}바이트 버림")
+        _telemetry_pending = None
+    _telemetry_pending_at = now
+
+    rest = bytearray()
+    raw = bytes(raw)
+    while raw:
+        if _telemetry_pending is None:
+            idx = raw.find(TEL_MARK)
+            if idx < 0:
+                rest += raw
+                break
+            rest += raw[:idx]
+            raw = raw[idx + 1:]
+            _telemetry_pending = bytearray()
+
+        if len(_telemetry_pending) < 3:
+            # 길이, 순번, 샘플 수 (나머지는 다음 알림에 올 수 있음)
+            take = 3 - len(_telemetry_pending)
+            _telemetry_pending += raw[:take]
+            raw = raw[take:]
+            if len(_telemetry_pending) < 3:
+                break
+            length, count = _telemetry_pending[0], _telemetry_pending[2]
+            if not (1 <= count <= TEL_BATCH and length == 4 + count * 4):
+                raw = bytes(_telemetry_pending) + raw
+                _telemetry_pending = None
+                continue
+        need = _telemetry_pending[0] + 1 - len(_telemetry_pending)
+        _telemetry_pending += raw[:need]
+        raw = raw[need:]
+        if len(_telemetry_pending) == _telemetry_pending[0] + 1:
+            _telemetry_frames.append(bytes(_telemetry_pending[1:]))
+            _telemetry_pending = None
+    return bytes(rest)
+
+
 def _internal_notification_handler(sender, data):
     """내부 알림 핸들러"""
     global _received_messages
+    link_monitor.record_notification()
+    traffic_trace.record(traffic_trace.BLE_NOTIFY, "", data)
     try:
-        message = data.decode('utf-8').strip()
+        message = _split_telemetry(data).decode('utf-8').strip()
+        if not message:
+            return
         _received_messages.append(message)
+        station_log.log_sampled("ble.notify", f"알림 수신: {message}")
         
         # 외부 핸들러가 등록되어 있으면 호출
         if _notification_handler:
@@ -42,13 +127,17 @@ def _internal_notification_handler(sender, data):
 
 
 async def force_disconnect():
-    """강제로 기존 연결 해제 (bluetoothctl 사용)"""
+    """강제로 기존 연결 해제 (bluetoothctl 사용, 이벤트 루프를 막지 않도록 비동기 실행)"""
     try:
-        subprocess.run(
-            ['bluetoothctl', 'disconnect', MICROBIT_ADDRESS],
-            capture_output=True,
-            timeout=2
+        proc = await asyncio.create_subprocess_exec(
+            'bluetoothctl', 'disconnect', _address,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
         )
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            proc.kill()
         await asyncio.sleep(0.5)
     except:
         pass
@@ -56,28 +145,127 @@ async def force_disconnect():
 
 # Heartbeat 송신 루프
 async def _heartbeat_loop():
-    """마이크로비트로 주기적으로 HB 신호 전송 (0.6초 주기)"""
+    """
+    마이크로비트로 HB 신호 전송 + 쓰기 지연/실패 기록
+    협상 성공: 마지막 쓰기 후 _hb_interval 동안 다른 쓰기가 없을 때만 전송
+    협상 실패: 이전처럼 고정 주기(0.6초)로 전송
+    """
+    global _last_write
     while _client and _client.is_connected:
+        if _hb_adaptive:
+            idle = time.monotonic() - _last_write
+            if idle < _hb_interval:
+                await asyncio.sleep(_hb_interval - idle)
+                continue
         try:
+            start = time.monotonic()
             await _client.write_gatt_char(
                 UART_RX_CHAR_UUID,
                 b"HB\n"
             )
+            _last_write = time.monotonic()
+            link_monitor.record_write(_last_write - start)
         except Exception as e:
-            # 연결 오류 시 루프 종료
-            break
-        await asyncio.sleep(0.6)  # 600ms 주기 (0.3~0.8초 범위 내)
+            link_monitor.record_failure()
+            station_log.log(f"Heartbeat 전송 실패 ({link_monitor.consecutive_failures()}회 연속): {e}", "WARNING")
+            # 연속으로 실패하면 링크 끊김으로 보고 루프 종료
+            if link_monitor.consecutive_failures() >= HB_MAX_FAILURES:
+                break
+            await asyncio.sleep(HB_LEGACY_INTERVAL)
+            continue
+        if not _hb_adaptive:
+            await asyncio.sleep(_hb_interval)
+
+
+async def _negotiate_heartbeat(interval=HB_IDLE_INTERVAL):
+    """
+    Heartbeat 간격 협상 (micro:bit가 이 간격 기준으로 끊김 판정 시간을 다시 계산)
+
+    Returns:
+        bool: 협상 성공 여부 (실패하면 고정 주기 HB 사용)
+    """
+    global _hb_interval, _hb_adaptive
+    _hb_interval, _hb_adaptive = HB_LEGACY_INTERVAL, False
+
+    key = "HB_INTERVAL"
+    if await send_command(f"CFG:{key}={int(interval * 1000)}"):
+        for _ in range(int(HB_NEGOTIATE_TIMEOUT / 0.1)):
+            applied = _applied_hb_interval()
+            if applied:
+                # micro:bit가 범위를 제한했을 수 있으므로 돌려받은 값으로 전송
+                _hb_interval, _hb_adaptive = applied / 1000, True
+                break
+            if any(f"CFG:ERR:{key}" in msg for msg in _received_messages):
+                break
+            await asyncio.sleep(0.1)
+    _received_messages.clear()
+    return _hb_adaptive
+
+
+def _applied_hb_interval():
+    """협상 응답 "CFG:HB=<ms>" 에서 micro:bit가 실제 적용한 간격(ms), 없으면 None"""
+    for msg in _received_messages:
+        _, found, value = msg.partition("CFG:HB=")
+        if found and value.strip().isdigit():
+            return int(value.strip())
+    return None
+
 
-async def connect(max_retries=7):
+async def connect(max_retries=7, address=None):
     """
     micro:bit에 연결 (재시도 포함)
     
     Args:
         max_retries (int): 최대 재시도 횟수 (기본값: 7)
+        address (str): 연결할 주소 (None이면 등록부 기준으로 선택)
     
     Returns:
         bool: 연결 성공 여부
     """
+    global _address
+
+    ble_registry.ensure_loaded()
+    _address = (address or ble_registry.preferred_address(MICROBIT_ADDRESS)).upper()
+    print(f" 연결 대상: {_address}")
+
+    connected = False
+    try:
+        connected = await _connect(max_retries)
+        return connected
+    finally:
+        # 연결에 실패했을 때만 백그라운드 스캔 재개
+        # (연결 중에는 스캔이 무선 시간을 나눠 쓰므로 멈춤, 연결 해제 시 다시 시작)
+        if not connected:
+            await _resume_scan()
+
+
+async def _resume_scan():
+    """백그라운드 스캔 재개 (새 장치 감지)"""
+    try:
+        await ble_registry.start_scan()
+    except Exception as e:
+        print(f"  백그라운드 스캔 시작 실패: {e}")
+
+
+async def _find_device(timeout=10.0):
+    """
+    연결할 장치 찾기
+    - 최근 광고를 받은 장치: 백그라운드 스캔에서 받은 BLEDevice로 바로 연결
+    - 그 외: 10초 스캔
+      (BleakClient에 주소 문자열만 넘기면 BlueZ 백엔드가 연결 타임아웃(30초) 동안 내부 스캔을 하므로 사용하지 않음)
+    """
+    device = ble_registry.fresh_device(_address)
+    if device:
+        print(" 등록된 장치 (최근 광고 수신) - 스캔 생략")
+        return device
+
+    print(f" 장치 스캔 중... ({timeout:.0f}초)")
+    if ble_registry.is_scanning():
+        return await ble_registry.wait_for_device(_address, timeout)
+    return await BleakScanner.find_device_by_address(_address, timeout=timeout)
+
+
+async def _connect(max_retries):
     global _client, _received_messages, _hb_task
     
     # 시작 전 기존 연결 강제 해제
@@ -91,13 +279,15 @@ async def connect(max_retries=7):
                 await force_disconnect()
                 await asyncio.sleep(4)
             
-            # 1단계: 장치 스캔으로 먼저 찾기 (더 안정적)
-            print(f" 장치 스캔 중... (10초)")
-            device = await BleakScanner.find_device_by_address(MICROBIT_ADDRESS, timeout=10.0)
+            # 1단계: 장치 찾기 (최근 광고를 받은 장치는 스캔 생략)
+            device = await _find_device()
             
             if not device:
                 print(f"❌ 장치를 찾을 수 없음 (시도 {attempt + 1}/{max_retries})")
                 continue
+
+            # 연결 중에는 백그라운드 스캔 중지 (BlueZ 연결 안정성)
+            await ble_registry.stop_scan()
             
             # 2단계: 발견된 장치 객체로 연결 (타임아웃 30초로 증가)
             _client = BleakClient(device, timeout=30.0)
@@ -154,9 +344,14 @@ async def connect(max_retries=7):
             # 6단계: 수신 버퍼 초기화
             _received_messages.clear()
             
-            # Heartbeat 송신 시작 (0.6초 주기로 HB 신호 전송)
+            # Heartbeat 간격 협상 후 송신 시작
+            link_monitor.reset()
+            if await _negotiate_heartbeat():
+                mode = f"유휴 {_hb_interval}초 후에만 전송"
+            else:
+                mode = f"협상 실패, {_hb_interval}초 고정 주기"
             _hb_task = asyncio.create_task(_heartbeat_loop())
-            print("✅ BLE 연결 성공 (Heartbeat 전송 시작: 0.6초 주기)")
+            print(f"✅ BLE 연결 성공 (Heartbeat: {mode})")
             return True
         
         except asyncio.TimeoutError:
@@ -184,6 +379,7 @@ async def disconnect():
     
     if not _client:
         print(" 연결되지 않은 상태")
+        await _resume_scan()
         return True
     
     if _hb_task:
@@ -191,12 +387,34 @@ async def disconnect():
         _hb_task = None
 
     if _client and _client.is_connected:
-      await _client.disconnect()
-      _client = None
+      try:
+        await _client.disconnect()
+      except Exception as e:
+        # 이미 끊긴 링크는 해제 중 오류가 날 수 있음
+        print(f"  연결 해제 오류: {e}")
+    _client = None
+    await _resume_scan()
     return True
 
+def current_address():
+    """현재 연결 대상 주소"""
+    return _address
+
+
+def link_health():
+    """
+    링크 품질 (Heartbeat 지연 / 실패, 알림 간격)
+
+    Returns:
+        dict: link_monitor.snapshot() 결과
+    """
+    return link_monitor.snapshot()
+
+
 def is_connected():
-    """연결 상태 확인"""
+    """연결 상태 확인 (Heartbeat가 연속 실패로 멈췄으면 끊긴 것으로 봄)"""
+    if _hb_task is not None and _hb_task.done():
+        return False
     return _client is not None and _client.is_connected
 
 
@@ -216,14 +434,19 @@ async def send_command(command):
         print("❌ 블루투스가 연결되지 않았습니다")
         return False
     
+    global _last_write
     try:
         message = f"{command}\n"
-        print(f" BLE 명령 전송: {command.strip()}")
+        traffic_trace.record(traffic_trace.BLE_WRITE, "", message)
+        start = time.monotonic()
         await _client.write_gatt_char(UART_RX_CHAR_UUID, message.encode())
-        print(f"✅ BLE 명령 전송 완료: {command.strip()}")
+        _last_write = time.monotonic()  # 명령도 micro:bit에는 Heartbeat 역할
+        link_monitor.record_write(_last_write - start)
+        station_log.log(f"✅ BLE 명령 전송 완료: {command.strip()}")
         return True
     except Exception as e:
-        print(f"❌ 명령 전송 오류: {e}")
+        link_monitor.record_failure()
+        station_log.log(f"❌ 명령 전송 오류: {e}", "ERROR")
         return False
 
 
@@ -237,3 +460,15 @@ def clear_received_messages():
     """수신된 메시지 버퍼 초기화"""
     global _received_messages
     _received_messages.clear()
+
+
+def get_telemetry_frames():
+    """수신된 주행 텔레메트리 프레임 목록 반환"""
+    return _telemetry_frames.copy()
+
+
+def clear_telemetry_frames():
+    """텔레메트리 버퍼 초기화"""
+    global _telemetry_pending
+    _telemetry_frames.clear()
+    _telemetry_pending = None
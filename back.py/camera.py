@@ -1,10 +1,12 @@
-import cv2
-import paho.mqtt.client as mqtt
 import json
 import time
 import base64
 import threading
-from datetime import datetime
+import atexit
+import station_log
+import traffic_trace
+import camera_devices
+import station_topics
 
 # ======================
 # MQTT 설정
@@ -13,11 +15,21 @@ MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 
 TOPIC_POWER = "power/control"
-TOPIC_CAMERA_SEND = "camera01/control"
+TOPIC_CAMERA_SEND = station_topics.out("camera01/control")
+TOPIC_SNAPSHOT_REQUEST = "camera/snapshot/request"    # {"id": ..., "camera": 1} (camera 생략 시 전체)
+TOPIC_SNAPSHOT_RESPONSE = station_topics.out("camera/snapshot/response")
+TOPIC_CODEC_BENCH = "camera/codec/bench"     # 코덱 벤치마크 요청 {"max_bytes": ..., "min_ssim": ...}
+TOPIC_CODEC_RESULT = station_topics.out("camera/codec/result")   # 벤치마크 결과 / 선택된 코덱
+TOPIC_CAMERA_STATUS = station_topics.out("camera/status")   # 카메라 상태 (retain)
+TOPIC_DRIVE_EVENT = "drive/event"                          # app.py 주행 시작/종료 → 영상 녹화
+TOPIC_CLIP = station_topics.out("camera/clip")             # 녹화한 영상 알림 (파일 경로)
+# 수신 토픽은 원래 이름으로 비교 (STATION_ID 가 있으면 stations/<ID>/ 아래에서 수신)
 
 # ======================
-# 카메라 디바이스 고정 (USB 웹캠 2개)
+# 카메라 디바이스
 # ======================
+# 전원 ON 때마다 USB 카메라를 자동 탐색 (USB 포트 경로 순서로 번호 부여)
+# 탐색 결과가 없을 때만 아래 고정 인덱스 사용
 CAMERA_DEVICES = {
     1: 0,
     2: 2
@@ -26,86 +38,384 @@ CAMERA_DEVICES = {
 # ======================
 # 전역 상태
 # ======================
-cams = {1: None, 2: None}
+cams = {}  # 카메라 번호 -> CameraWorker
 camera_power = False
+power_lock = threading.Lock()  # 전원 ON/OFF 와 대기 시간 초과 해제가 겹치지 않도록
+
+# 대기 모드: POWER_OFF 때 장치를 닫지 않고 읽기만 멈춤 → 다음 POWER_ON 이 워밍업 없이 바로 재개
+# STANDBY_TIMEOUT 동안 다시 켜지지 않으면 완전히 해제
+STANDBY_ENABLED = True
+STANDBY_TIMEOUT = 300  # 초
+standby_timer = None
+
+# 공유 메모리 프레임 버스 (다른 로컬 프로세스가 카메라를 열지 않고 프레임을 읽음)
+FRAME_BUS_ENABLED = True
+frame_bus_writer = None
+
+# 주행 구간 영상 (주행 시작 ~ 결과 이벤트 사이 모든 카메라 프레임을 로컬 AVI로 저장)
+CLIP_ENABLED = True
+clip_recorder = None
 
 auto_capture_thread = None
 auto_capture_running = False
 CAPTURE_INTERVAL = 7  # 초
 
+# ======================
+# 이미지 코덱
+# ======================
+SEND_MAX_WIDTH = 320
+CODEC_BENCH_ON_POWER_ON = True  # 전원 ON 때 실제 프레임으로 코덱 측정 후 자동 선택
+CODEC_MAX_BYTES = 60000         # 프레임 1장 크기 기준
+CODEC_MIN_SSIM = 0.95           # 화질 기준
+codec = {"name": "png", "format": "png", "ext": ".png", "params": []}  # 현재 인코더
+codec_bench_thread = None
+
+# 메모리 재사용 경로: 카메라별 축소 버퍼 재사용 + 전송 JSON 을 bytearray 하나에 바로 작성
+# (python frame_path.py 로 기존 경로와 할당량 비교)
+REUSE_FRAME_BUFFERS = True
+
+# 합성 모드: 모든 카메라 프레임을 한 캔버스에 가로로 이어 붙여 한 번만 인코딩
+# (백엔드는 layout 의 좌표로 잘라서 사용)
+COMPOSITE_MODE = False
+composite_canvas = None  # 미리 할당한 캔버스 (크기가 바뀔 때만 새로 할당)
+
+# cv2(+numpy)는 무거워서 처음 필요할 때 로딩
+cv2 = None
+
 # ======================
 # 로그
 # ======================
 def log(msg, level="INFO"):
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [{level}] {msg}")
+    # 포맷/출력은 station_log 백그라운드 스레드에서 처리 (촬영 스레드 블로킹 방지)
+    station_log.log(msg, level)
+
+# ======================
+# 지연 로딩
+# ======================
+def load_cv2():
+    """cv2 모듈 로딩 (이미 로딩됐으면 바로 반환)"""
+    global cv2
+    if cv2 is None:
+        start = time.time()
+        cv2 = camera_devices.load_cv2()
+        log(f"cv2 로딩 완료 ({time.time() - start:.2f}초)")
+    return cv2
 
 # ======================
-# 이미지 인코딩 (PNG 유지)
+# 이미지 인코딩
 # ======================
-def encode_png(image, max_width=320):
+def resize_for_send(image, max_width=SEND_MAX_WIDTH):
     h, w = image.shape[:2]
     if w > max_width:
         scale = max_width / w
         image = cv2.resize(image, (max_width, int(h * scale)))
+    return image
+
 
-    _, buffer = cv2.imencode(".png", image)
+def encode_image(image, max_width=SEND_MAX_WIDTH):
+    """전송 크기로 줄인 뒤 현재 선택된 코덱으로 인코딩 (base64)"""
+    image = resize_for_send(image, max_width)
+    current = codec  # 벤치마크 중 교체되어도 한 장은 같은 코덱으로
+    _, buffer = cv2.imencode(current["ext"], image, current["params"])
     return base64.b64encode(buffer).decode()
 
+def composite_frames(frames, tile_width=SEND_MAX_WIDTH):
+    """
+    프레임들을 미리 할당한 캔버스에 가로로 배치 (cv2.resize 가 캔버스에 바로 기록)
+
+    Args:
+        frames (list): 카메라 번호 순서의 원본 프레임
+
+    Returns:
+        tuple: (캔버스, 타일 배치 [{"x", "y", "w", "h"}, ...])
+    """
+    global composite_canvas
+    h, w = frames[0].shape[:2]
+    tile_w = min(w, tile_width)
+    tile_h = int(h * tile_w / w)
+    shape = (tile_h, tile_w * len(frames), 3)
+
+    if composite_canvas is None or composite_canvas.shape != shape:
+        import numpy as np
+        composite_canvas = np.empty(shape, dtype=np.uint8)
+
+    tiles = []
+    for i, frame in enumerate(frames):
+        x = i * tile_w
+        view = composite_canvas[:, x:x + tile_w]
+        if frame.shape[:2] == (tile_h, tile_w):
+            view[...] = frame
+        else:
+            cv2.resize(frame, (tile_w, tile_h), dst=view)
+        tiles.append({"x": x, "y": 0, "w": tile_w, "h": tile_h})
+    return composite_canvas, tiles
+
+def make_encoder():
+    """카메라 작업 스레드용 인코더 (재사용 경로면 카메라마다 축소 버퍼를 따로 가짐)"""
+    if not REUSE_FRAME_BUFFERS:
+        return encode_image
+    import frame_path
+    return frame_path.FrameEncoder(SEND_MAX_WIDTH, lambda: codec)
+
+# ======================
+# 코덱 벤치마크 / 자동 선택
+# ======================
+def run_codec_bench(max_bytes=CODEC_MAX_BYTES, min_ssim=CODEC_MIN_SSIM):
+    """현재 카메라 프레임으로 코덱 측정 → 기준에 맞는 가장 빠른 코덱 선택 → 결과 발행"""
+    global codec
+    import codec_bench
+
+    frames = []
+    for _ in range(20):  # 전원 ON 직후에는 첫 프레임까지 잠시 대기
+        latest = [cams[num].latest()[0] for num in sorted(cams)]
+        frames = [resize_for_send(f) for f in latest if f is not None]
+        if frames and len(frames) == len(latest):
+            break
+        time.sleep(0.1)
+    if not frames:
+        log("코덱 벤치마크: 프레임 없음 (카메라 OFF)", "WARNING")
+        return
+
+    log(f"코덱 벤치마크 시작 (프레임 {len(frames)}장)")
+    results = codec_bench.run(frames)
+    selected = codec_bench.select(results, max_bytes, min_ssim)
+    if selected:
+        codec = next(c for c in codec_bench.candidates() if c["name"] == selected)
+
+    mqtt_client.publish(TOPIC_CODEC_RESULT, json.dumps({
+        "timestamp": time.time(),
+        "station": codec_bench.station_info(),
+        "budget": {"max_bytes": max_bytes, "min_ssim": min_ssim},
+        "selected": codec["name"],
+        "results": results
+    }), retain=True)
+    log(f"코덱 선택: {codec['name']} (후보 {len(results)}개)")
+
+
+def start_codec_bench(**budget):
+    """벤치마크를 백그라운드로 실행 (이미 실행 중이면 무시)"""
+    global codec_bench_thread
+    if codec_bench_thread and codec_bench_thread.is_alive():
+        return
+    codec_bench_thread = threading.Thread(target=run_codec_bench, kwargs=budget, daemon=True)
+    codec_bench_thread.start()
+
 # ======================
 # 카메라 전원 ON
 # ======================
+def find_cameras():
+    """
+    사용할 카메라 목록
+
+    Returns:
+        list: [(번호, /dev/videoN 의 N, 고정 식별자), ...]
+    """
+    found = camera_devices.discover_cameras()
+    if found:
+        return [(num, cam["index"], cam["id"]) for num, cam in enumerate(found, start=1)]
+
+    log("카메라 자동 탐색 실패, 고정 인덱스 사용", "WARNING")
+    return [(num, index, None) for num, index in sorted(CAMERA_DEVICES.items())]
+
+
+def open_frame_bus():
+    """프레임 버스 생성 (처음 한 번만, 전원 OFF 후에도 리더가 붙어 있을 수 있어 유지)"""
+    global frame_bus_writer
+    if not FRAME_BUS_ENABLED or frame_bus_writer:
+        return frame_bus_writer
+
+    import frame_bus
+    try:
+        frame_bus_writer = frame_bus.FrameBusWriter()
+        atexit.register(frame_bus_writer.close)
+        log(f"프레임 버스 생성: {frame_bus_writer.name} ({frame_bus_writer.slots}슬롯)")
+    except Exception as e:
+        log(f"프레임 버스 생성 실패: {e}", "WARNING")
+    return frame_bus_writer
+
+
+def handle_frame(num, frame, ts):
+    """카메라 작업 스레드에서 프레임마다 호출 (프레임 버스 / 주행 영상)"""
+    if frame_bus_writer:
+        frame_bus_writer.publish(num, frame, ts)
+    if clip_recorder:
+        clip_recorder.write(num, frame, ts)
+
+
 def camera_power_on():
+    with power_lock:
+        _camera_power_on()
+        publish_camera_status()
+
+
+def camera_state():
+    if camera_power:
+        return "on"
+    return "standby" if cams else "off"
+
+
+def publish_camera_status(state=None):
+    """카메라 상태 알림 (retain)"""
+    mqtt_client.publish(TOPIC_CAMERA_STATUS, json.dumps({
+        "station": station_topics.station_name(),
+        "state": state or camera_state(),
+        "cameras": [cams[num].camera_id for num in sorted(cams)],
+        "codec": codec["name"],
+        "timestamp": time.time()
+    }), retain=True)
+
+
+def _resume_standby():
+    """대기 중인 카메라 재개 (성공 여부 반환)"""
+    global camera_power
+
+    if not cams or not all(w.is_paused() for w in cams.values()):
+        return False
+
+    started = time.time()
+    for worker in cams.values():
+        worker.resume()
+    camera_power = True
+    start_auto_capture()
+    log(f"카메라 대기 해제 ({(time.time() - started) * 1000:.1f}ms)")
+    return True
+
+
+def _camera_power_on():
     global camera_power, cams
 
     if camera_power:
         log("카메라 이미 ON 상태")
         return
 
+    cancel_standby_timer()
+    if _resume_standby():
+        return
+
     log("카메라 전원 ON 시작")
+    load_cv2()
+    open_frame_bus()
+
+    workers = {
+        num: camera_devices.CameraWorker(
+            num, index, camera_id,
+            encoder=None if COMPOSITE_MODE else make_encoder(),  # 합성 모드는 합친 뒤 한 번만 인코딩
+            on_frame=handle_frame
+        )
+        for num, index, camera_id in find_cameras()
+    }
 
-    for num in [1, 2]:
-        index = CAMERA_DEVICES[num]
-        cam = cv2.VideoCapture(index, cv2.CAP_V4L2)
-        cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
-        cam.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cam.set(cv2.CAP_PROP_FPS, 15)
-        cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-
-        time.sleep(2.0)  # 워밍업
-
-        ret, _ = cam.read()
-        if not ret:
-            log(f"카메라 {num} 열기 실패 (index: {index})", "ERROR")
-            cam.release()
-            camera_power_off()
+    # ✅ 모든 카메라를 동시에 열고 워밍업 (카메라 수와 상관없이 약 2초)
+    opened = {}
+    openers = [
+        threading.Thread(target=lambda w=w: opened.__setitem__(w.num, w.open()))
+        for w in workers.values()
+    ]
+    for t in openers:
+        t.start()
+    for t in openers:
+        t.join()
+
+    for num, worker in workers.items():
+        if not opened.get(num):
+            log(f"카메라 {num} 열기 실패 (index: {worker.index}, {worker.camera_id})", "ERROR")
+            cams = workers
+            release_cameras()
             return
+        worker.start()
+        log(f"카메라 {num} ON 완료 ({worker.camera_id})")
 
-        cams[num] = cam
-        log(f"카메라 {num} ON 완료")
-
+    cams = workers
     camera_power = True
     start_auto_capture()
 
+    if CODEC_BENCH_ON_POWER_ON:
+        start_codec_bench()
+
 # ======================
 # 카메라 전원 OFF
 # ======================
 def camera_power_off():
+    """전원 OFF (대기 모드가 켜져 있으면 장치를 열어둔 채 대기)"""
+    global camera_power
+
+    with power_lock:
+        if not STANDBY_ENABLED:
+            release_cameras()
+            publish_camera_status()
+            return
+        if not camera_power:
+            return  # 이미 OFF / 대기 상태
+
+        stop_auto_capture()
+        for worker in cams.values():
+            worker.pause()
+        camera_power = False
+        start_standby_timer()
+        log(f"카메라 대기 모드 ({STANDBY_TIMEOUT}초 후 완전히 해제)")
+        publish_camera_status()
+
+
+def release_cameras():
+    """카메라 장치 완전히 해제 (power_lock 을 잡은 상태에서 호출)"""
     global camera_power, cams
 
+    cancel_standby_timer()
     stop_auto_capture()
 
-    for num in [1, 2]:
-        if cams[num]:
-            cams[num].release()
-            cams[num] = None
+    for num, worker in cams.items():
+        if worker.cap:
+            worker.release()
             log(f"카메라 {num} OFF")
+    cams = {}
 
     camera_power = False
 
+
+def release_on_idle():
+    """대기 시간 초과 → 완전히 해제 (그 사이 다시 켜졌으면 무시)"""
+    with power_lock:
+        if camera_power or not cams:
+            return
+        log("카메라 대기 시간 초과, 장치 해제")
+        release_cameras()
+        publish_camera_status()
+
+
+def start_standby_timer():
+    global standby_timer
+    cancel_standby_timer()
+    standby_timer = threading.Timer(STANDBY_TIMEOUT, release_on_idle)
+    standby_timer.daemon = True
+    standby_timer.start()
+
+
+def cancel_standby_timer():
+    global standby_timer
+    if standby_timer:
+        standby_timer.cancel()
+        standby_timer = None
+
 # ======================
 # 자동 촬영 루프
 # ======================
+def capture_all(timeout=3.0):
+    """
+    모든 카메라에 동시에 촬영 요청 후 결과 수집
+
+    Returns:
+        list: 카메라 번호 순서의 (프레임, 인코딩 결과), 하나라도 실패하면 None
+    """
+    workers = [cams[num] for num in sorted(cams)]
+    for worker in workers:
+        worker.trigger()
+
+    results = [worker.wait(timeout) for worker in workers]
+    if not workers or any(r is None for r in results):
+        return None
+    return results
+
+
 def auto_capture_loop():
     global auto_capture_running
 
@@ -113,13 +423,14 @@ def auto_capture_loop():
 
     while auto_capture_running:
         try:
-            # ✅ 동시에 두 카메라에서 프레임 읽기
-            ret1, frame1 = cams[1].read()
-            ret2, frame2 = cams[2].read()
-
-            if ret1 and ret2:
-                # ✅ 같은 시간에 찍은 이미지 2개를 하나의 리스트로 묶어서 전송
-                send_images_together(frame1, frame2)
+            # ✅ 모든 카메라에서 동시에 프레임 읽기 + 인코딩 (카메라별 스레드)
+            results = capture_all()
+
+            if results and COMPOSITE_MODE:
+                send_composite([frame for frame, _ in results])
+            elif results:
+                # ✅ 같은 시간에 찍은 이미지들을 하나의 리스트로 묶어서 전송
+                send_images_together([encoded for _, encoded in results])
             else:
                 log("프레임 수신 실패", "WARNING")
 
@@ -157,50 +468,231 @@ def stop_auto_capture():
 # ======================
 
 
-def send_images_together(frame1, frame2):
-    """같은 시간에 찍은 이미지 2개를 하나의 리스트로 묶어서 전송"""
+def send_images_together(images):
+    """
+    같은 시간에 찍은 이미지들을 하나의 리스트로 묶어서 전송
+
+    Args:
+        images (list): 카메라 번호 순서의 base64 이미지 (재사용 경로면 bytes)
+    """
+    timestamp = time.time()
+    cameras = [cams[num].camera_id for num in sorted(cams)]
+    if images and isinstance(images[0], bytes):
+        import frame_path
+        payload = frame_path.build_images_payload(timestamp, images, codec["format"], cameras)
+        mqtt_client.publish(TOPIC_CAMERA_SEND, payload)
+        log(f"이미지 {len(images)}개 전송 완료 (timestamp: {timestamp}, {len(payload)}바이트)")
+        return
+
+    payload = {
+        "timestamp": timestamp,
+        "images": images,
+        "format": codec["format"],
+        "cameras": cameras
+    }
+    mqtt_client.publish(TOPIC_CAMERA_SEND, json.dumps(payload))
+    log(f"이미지 {len(images)}개 전송 완료 (timestamp: {timestamp})")
+
+
+def send_composite(frames):
+    """
+    같은 시간에 찍은 프레임들을 한 장으로 합쳐 한 번만 인코딩해서 전송
+
+    Args:
+        frames (list): 카메라 번호 순서의 원본 프레임
+    """
     timestamp = time.time()
+    canvas, tiles = composite_frames(frames)
+    current = codec
+    _, buffer = cv2.imencode(current["ext"], canvas, current["params"])
+
+    nums = sorted(cams)
     payload = {
         "timestamp": timestamp,
-        "images": [
-            encode_png(frame1),
-            encode_png(frame2)
-        ]
+        "image": base64.b64encode(buffer).decode(),
+        "format": current["format"],
+        "layout": {
+            "width": canvas.shape[1],
+            "height": canvas.shape[0],
+            "tiles": [
+                {"camera": num, "camera_id": cams[num].camera_id, **tile}
+                for num, tile in zip(nums, tiles)
+            ]
+        }
     }
     mqtt_client.publish(TOPIC_CAMERA_SEND, json.dumps(payload))
-    log(f"이미지 2개 전송 완료 (camera01, camera02, timestamp: {timestamp})")
+    log(f"합성 이미지 전송 완료 ({len(frames)}대, {len(buffer)}바이트, timestamp: {timestamp})")
+
+# ======================
+# 즉시 스냅샷 (요청/응답)
+# ======================
+def handle_snapshot(request):
+    """
+    최신 프레임 슬롯에서 바로 이미지를 꺼내 응답 (카메라를 새로 열거나 촬영 주기를 기다리지 않음)
+
+    Args:
+        request (dict): {"id": 요청 ID, "camera": 카메라 번호 (생략 / null 이면 전체)}
+
+    잘못된 요청이어도 같은 id 로 error 를 담아 항상 응답
+    """
+    started = time.time()
+    response = {"id": request.get("id"), "timestamp": started, "format": codec["format"], "frames": []}
+
+    nums = []
+    if not camera_power:
+        response["error"] = "camera off"
+    else:
+        try:
+            nums = snapshot_cameras(request.get("camera"))
+        except ValueError as e:
+            response["error"] = str(e)
+
+    try:
+        for num in nums:
+            worker = cams.get(num)
+            frame, captured_at = worker.latest() if worker else (None, 0.0)
+            if frame is None:
+                response["frames"].append({"camera": num, "error": "no frame"})
+                continue
+            response["frames"].append({
+                "camera": num,
+                "camera_id": worker.camera_id,
+                "captured_at": captured_at,
+                "age_ms": round((started - captured_at) * 1000, 1),
+                "image": encode_image(frame)
+            })
+    except Exception as e:
+        response["error"] = f"snapshot failed: {e}"
+
+    response["elapsed_ms"] = round((time.time() - started) * 1000, 1)
+    mqtt_client.publish(TOPIC_SNAPSHOT_RESPONSE, json.dumps(response))
+    log(f"스냅샷 응답 (id: {response['id']}, {len(response['frames'])}장, {response['elapsed_ms']}ms"
+        + (f", {response['error']})" if "error" in response else ")"))
+
+
+def snapshot_cameras(value):
+    """
+    스냅샷 요청의 camera 값 → 카메라 번호 목록
+
+    Raises:
+        ValueError: 정수가 아니거나 없는 카메라 번호
+    """
+    if value is None:
+        return sorted(cams)
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+        raise ValueError(f"invalid camera: {value!r}")
+    num = int(value)
+    if num not in cams:
+        raise ValueError(f"unknown camera: {num}")
+    return [num]
+
+
+# ======================
+# 주행 영상
+# ======================
+def handle_drive_event(event):
+    """
+    주행 시작이면 녹화 시작, 종료면 녹화를 끝내고 영상 경로 발행
+
+    Args:
+        event (dict): {"event": "start" / "end", "car_id": ..., "result": ...}
+    """
+    global clip_recorder
+    import drive_clip
+
+    if clip_recorder is None:
+        clip_recorder = drive_clip.ClipRecorder()
+
+    if event.get("event") == "start":
+        if not camera_power:
+            log("주행 영상: 카메라 OFF 상태라 녹화 생략", "WARNING")
+            return
+        clip_id = drive_clip.new_clip_id(event.get("car_id"))
+        cameras = {num: cams[num].camera_id for num in sorted(cams)}
+        if clip_recorder.start(clip_id, cameras, on_timeout=publish_clip):
+            log(f"주행 영상 녹화 시작: {clip_id}")
+
+    elif event.get("event") == "end":
+        info = clip_recorder.stop()
+        if info:
+            info["result"] = event.get("result")
+            publish_clip(info)
+
+
+def publish_clip(info):
+    """영상 파일은 로컬에 두고 경로만 알림"""
+    info["station"] = station_topics.station_name()
+    mqtt_client.publish(TOPIC_CLIP, json.dumps(info))
+    frames = sum(f["frames"] for f in info["files"])
+    log(f"주행 영상 저장: {info['clip_id']} ({info['duration_sec']}초, {len(info['files'])}대, {frames}프레임)")
 
 # ======================
 # MQTT 콜백
 # ======================
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties=None):
     log("MQTT 연결 완료")
-    client.subscribe(TOPIC_POWER)
+    client.subscribe(station_topics.subscriptions([
+        TOPIC_POWER, TOPIC_SNAPSHOT_REQUEST, TOPIC_CODEC_BENCH, TOPIC_DRIVE_EVENT
+    ]))
+    publish_camera_status()
 
 def on_message(client, userdata, msg):
+    traffic_trace.record(traffic_trace.MQTT_IN, msg.topic, msg.payload)
+    topic = station_topics.name_of(msg.topic)
+    payload = None
     try:
         payload = json.loads(msg.payload.decode())
         command = payload.get("command")
 
-        if msg.topic == TOPIC_POWER:
+        if topic == TOPIC_POWER:
             if command == "POWER_ON":
                 camera_power_on()
             elif command == "POWER_OFF":
                 camera_power_off()
+            elif command == "RELEASE":
+                with power_lock:
+                    release_cameras()  # 대기 없이 바로 장치 해제
+                    publish_camera_status()
+
+        elif topic == TOPIC_DRIVE_EVENT:
+            if CLIP_ENABLED:
+                handle_drive_event(payload)
+
+        elif topic == TOPIC_SNAPSHOT_REQUEST:
+            handle_snapshot(payload)
+
+        elif topic == TOPIC_CODEC_BENCH:
+            start_codec_bench(
+                max_bytes=int(payload.get("max_bytes", CODEC_MAX_BYTES)),
+                min_ssim=float(payload.get("min_ssim", CODEC_MIN_SSIM))
+            )
 
     except Exception as e:
         log(f"MQTT 처리 오류: {e}", "ERROR")
+        if topic == TOPIC_SNAPSHOT_REQUEST:
+            # 요청 형식 오류여도 응답을 기다리는 쪽이 시간 초과로 끝나지 않도록 error 응답
+            request_id = payload.get("id") if isinstance(payload, dict) else None
+            mqtt_client.publish(TOPIC_SNAPSHOT_RESPONSE, json.dumps({
+                "id": request_id, "timestamp": time.time(), "frames": [], "error": f"bad request: {e}"
+            }))
 
 # ======================
 # 메인
 # ======================
-mqtt_client = mqtt.Client()
+mqtt_client = traffic_trace.attach_mqtt(station_topics.create_client())
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 
 def main():
+    station_log.install_dump_signal()
+    traffic_trace.start_from_env("camera")
     log("카메라 제어 모듈 시작")
+    mqtt_client.will_set(TOPIC_CAMERA_STATUS, json.dumps({
+        "station": station_topics.station_name(), "state": "offline"
+    }), retain=True)
     mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    # MQTT 연결 후 백그라운드에서 미리 로딩 (첫 POWER_ON 지연 감소)
+    threading.Thread(target=load_cv2, daemon=True).start()
     mqtt_client.loop_forever()
 
 if __name__ == "__main__":
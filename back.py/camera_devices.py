@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+USB 카메라 자동 탐색 / 카메라별 작업 스레드
+- /dev/video* 중 영상 캡처가 가능한 USB 노드만 골라 USB 포트 경로(bus_info)로 정렬
+  → 재부팅 후 /dev/video 번호가 바뀌어도 카메라 순서가 유지됨
+- 카메라마다 전용 스레드가 촬영과 인코딩을 처리 (cv2가 GIL을 풀어서 코어별로 병렬 실행)
+- 작업 스레드는 계속 프레임을 읽어서 최신 프레임 슬롯을 갱신 (즉시 스냅샷용)
+"""
+import fcntl
+import os
+import threading
+import time
+
+V4L2_SYSFS = "/sys/class/video4linux"
+
+# linux/videodev2.h
+VIDIOC_QUERYCAP = 0x80685600        # _IOR('V', 0, struct v4l2_capability) (104바이트)
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+USB_ONLY = True  # 라즈베리파이 내장 ISP/코덱 노드 제외
+CAMERA_FPS = 15
+STANDBY_FPS = 5              # 대기 모드 스트림 FPS (USB 대역폭 / 전력 절감)
+STANDBY_GRAB_INTERVAL = 1.0  # 대기 모드에서 버퍼를 비우는 주기 (초)
+
+# cv2(+numpy)는 무거워서 처음 필요할 때 로딩
+cv2 = None
+_cv2_lock = threading.Lock()
+
+
+def load_cv2():
+    """cv2 모듈 로딩 (이미 로딩됐으면 바로 반환)"""
+    global cv2
+    with _cv2_lock:
+        if cv2 is None:
+            import cv2 as _cv2
+            cv2 = _cv2
+    return cv2
+
+
+# ======================
+# 카메라 탐색
+# ======================
+def query_capture_device(path):
+    """
+    V4L2 장치 정보 조회
+
+    Returns:
+        dict: {"card": 이름, "bus_info": USB 경로} 또는 None (캡처 불가 / 열기 실패)
+    """
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None
+
+    try:
+        buf = bytearray(104)
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+    capabilities = int.from_bytes(buf[84:88], "little")
+    device_caps = int.from_bytes(buf[88:92], "little")
+    caps = device_caps if capabilities & V4L2_CAP_DEVICE_CAPS else capabilities
+    # UVC 카메라는 메타데이터 노드도 만들기 때문에 VIDEO_CAPTURE 여부로 거름
+    if not caps & V4L2_CAP_VIDEO_CAPTURE:
+        return None
+
+    return {
+        "card": buf[16:48].split(b"\0", 1)[0].decode(errors="replace"),
+        "bus_info": buf[48:80].split(b"\0", 1)[0].decode(errors="replace"),
+    }
+
+
+def discover_cameras():
+    """
+    캡처 가능한 카메라 목록을 USB 경로 순서로 반환
+
+    Returns:
+        list: [{"id": bus_info, "device": "/dev/videoN", "index": N, "card": 이름}, ...]
+    """
+    if not os.path.isdir(V4L2_SYSFS):
+        return []
+
+    found = {}
+    for name in os.listdir(V4L2_SYSFS):
+        if not name.startswith("video"):
+            continue
+        index = int(name[len("video"):])
+        info = query_capture_device(f"/dev/{name}")
+        if not info:
+            continue
+        if USB_ONLY and not info["bus_info"].startswith("usb-"):
+            continue
+
+        # 같은 카메라에서 여러 캡처 노드가 나오면 번호가 가장 작은 노드 사용
+        bus = info["bus_info"]
+        if bus not in found or index < found[bus]["index"]:
+            found[bus] = {
+                "id": bus,
+                "device": f"/dev/{name}",
+                "index": index,
+                "card": info["card"],
+            }
+
+    return [found[bus] for bus in sorted(found)]
+
+
+# ======================
+# 카메라 작업 스레드
+# ======================
+class CameraWorker:
+    """카메라 1대 전담 (열기 / 최신 프레임 유지 / 촬영 요청 처리 / 인코딩)"""
+
+    def __init__(self, num, index, camera_id=None, encoder=None, on_frame=None):
+        """
+        Args:
+            num (int): 카메라 번호 (1부터)
+            index (int): /dev/videoN 의 N
+            camera_id (str): 고정 식별자 (USB 경로)
+            encoder (callable): 프레임 → 전송용 데이터 변환 함수 (작업 스레드에서 실행)
+            on_frame (callable): 프레임을 읽을 때마다 호출 (번호, 프레임, 시각)
+        """
+        self.num = num
+        self.index = index
+        self.camera_id = camera_id or f"video{index}"
+        self.encoder = encoder
+        self.on_frame = on_frame
+        self.cap = None
+
+        self._running = False
+        self._thread = None
+        self._paused = threading.Event()  # 대기 모드 (장치는 열어둔 채 읽기 중지)
+        self._standby = False             # 스트림을 대기 모드 FPS로 바꿨는지 (작업 스레드에서만 변경)
+        self._wake = threading.Event()
+        self._trigger = threading.Event()
+        self._done = threading.Event()
+        self._result = None
+
+        # 최신 프레임 슬롯 (작업 스레드가 계속 갱신)
+        self._latest_lock = threading.Lock()
+        self._latest = None
+        self._latest_ts = 0.0
+
+    # ---------- 장치 ----------
+    def open(self, warmup=2.0):
+        """카메라 열기 + 워밍업 (성공 여부 반환)"""
+        load_cv2()
+        cap = cv2.VideoCapture(self.index, cv2.CAP_V4L2)
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        time.sleep(warmup)  # 워밍업
+
+        ret, _ = cap.read()
+        if not ret:
+            cap.release()
+            return False
+
+        self.cap = cap
+        return True
+
+    def release(self):
+        self.stop()
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+        with self._latest_lock:
+            self._latest = None
+            self._latest_ts = 0.0
+
+    # ---------- 스레드 ----------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._loop, name=f"camera{self.num}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        self._trigger.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def pause(self):
+        """
+        대기 모드: 장치는 열어둔 채 스트림을 STANDBY_FPS로 낮추고 프레임 읽기를 멈춤
+        (STANDBY_GRAB_INTERVAL 마다 grab 한 번으로 드라이버 버퍼만 비움)
+        """
+        self._paused.set()
+        with self._latest_lock:
+            self._latest = None  # 대기 중 오래된 프레임을 스냅샷으로 내보내지 않음
+            self._latest_ts = 0.0
+
+    def resume(self):
+        """대기 모드 해제 (작업 스레드가 FPS를 되돌리고 남은 프레임을 버린 뒤 갱신 재개)"""
+        self._paused.clear()
+        self._wake.set()
+
+    def is_paused(self):
+        return self._paused.is_set()
+
+    def latest(self):
+        """
+        가장 최근에 읽은 프레임 (카메라를 기다리지 않고 바로 반환)
+
+        Returns:
+            tuple: (프레임, 촬영 시각) 또는 (None, 0.0)
+        """
+        with self._latest_lock:
+            return self._latest, self._latest_ts
+
+    def trigger(self):
+        """촬영 요청 (바로 반환, 결과는 wait()로 받음)"""
+        self._done.clear()
+        self._result = None
+        self._trigger.set()
+
+    def wait(self, timeout=3.0):
+        """
+        촬영 결과 대기
+
+        Returns:
+            tuple: (프레임, 인코딩 결과) 또는 None (실패 / 시간 초과)
+        """
+        if not self._done.wait(timeout):
+            return None
+        return self._result
+
+    def _set_standby(self, standby):
+        """스트림 FPS 변경 (cap 은 작업 스레드에서만 다룸) + 재개 시 대기 중 쌓인 프레임 버림"""
+        self._standby = standby
+        try:
+            self.cap.set(cv2.CAP_PROP_FPS, STANDBY_FPS if standby else CAMERA_FPS)
+            if not standby:
+                self.cap.grab()  # 버퍼에 남아 있던 대기 중 프레임은 _latest 로 내보내지 않음
+        except Exception:
+            pass
+
+    def _loop(self):
+        while self._running:
+            if self._paused.is_set():
+                if not self._standby:
+                    self._set_standby(True)
+                self._wake.wait(STANDBY_GRAB_INTERVAL)
+                self._wake.clear()
+                if self._paused.is_set() and self._running:
+                    try:
+                        self.cap.grab()
+                    except Exception:
+                        pass
+                continue
+            if self._standby:
+                self._set_standby(False)
+
+            # cap.read()가 카메라 FPS에 맞춰 대기하므로 별도 sleep 없음
+            try:
+                ret, frame = self.cap.read()
+            except Exception:
+                ret, frame = False, None
+
+            if ret:
+                now = time.time()
+                with self._latest_lock:
+                    self._latest = frame
+                    self._latest_ts = now
+                if self.on_frame:
+                    try:
+                        self.on_frame(self.num, frame, now)
+                    except Exception:
+                        pass
+            elif not self._trigger.is_set():
+                time.sleep(0.05)  # 카메라 오류 시 바쁜 대기 방지
+
+            if not self._trigger.is_set():
+                continue
+            self._trigger.clear()
+
+            result = None
+            if ret:
+                try:
+                    encoded = self.encoder(frame) if self.encoder else None
+                    result = (frame, encoded)
+                except Exception:
+                    result = None
+
+            self._result = result
+            self._done.set()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+이미지 코덱 벤치마크 / 자동 선택
+스테이션의 실제 카메라 프레임으로 PNG 압축 레벨, JPEG 품질, WebP 품질별
+인코딩 시간 / 크기 / 화질(SSIM)을 측정하고, 기준을 만족하는 가장 빠른 코덱을 고름
+"""
+import os
+import platform
+import socket
+import time
+
+import numpy as np
+
+import camera_devices
+
+# 측정 후보: (이름, 확장자, 옵션 키, 옵션 값)
+PNG_LEVELS = (1, 3, 6, 9)
+JPEG_QUALITIES = (60, 75, 85, 95)
+WEBP_QUALITIES = (50, 75, 90)
+
+# 선택 기준 기본값
+DEFAULT_MAX_BYTES = 60000   # 프레임 1장 최대 크기
+DEFAULT_MIN_SSIM = 0.95     # 최소 화질
+REPEAT = 3                  # 프레임당 반복 측정 횟수
+
+
+def candidates():
+    """측정할 코덱 목록 [{"name", "format", "ext", "params"}, ...]"""
+    cv2 = camera_devices.load_cv2()
+    result = []
+    for level in PNG_LEVELS:
+        result.append({"name": f"png-{level}", "format": "png", "ext": ".png",
+                       "params": [cv2.IMWRITE_PNG_COMPRESSION, level]})
+    for quality in JPEG_QUALITIES:
+        result.append({"name": f"jpeg-{quality}", "format": "jpeg", "ext": ".jpg",
+                       "params": [cv2.IMWRITE_JPEG_QUALITY, quality]})
+    for quality in WEBP_QUALITIES:
+        result.append({"name": f"webp-{quality}", "format": "webp", "ext": ".webp",
+                       "params": [cv2.IMWRITE_WEBP_QUALITY, quality]})
+    return result
+
+
+def ssim(a, b):
+    """두 이미지의 SSIM (흑백, 11x11 가우시안 창)"""
+    cv2 = camera_devices.load_cv2()
+    if a.ndim == 3:
+        a = cv2.cvtColor(a, cv2.COLOR_BGR2GRAY)
+        b = cv2.cvtColor(b, cv2.COLOR_BGR2GRAY)
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    blur = lambda x: cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / (
+        (mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2)
+    )
+    return float(ssim_map.mean())
+
+
+def measure(codec, frames, repeat=REPEAT):
+    """
+    코덱 1개 측정
+
+    Returns:
+        dict: 이름, 프레임당 인코딩 시간(ms, 중앙값), 평균 크기, 최저 SSIM
+        (이 빌드의 OpenCV가 지원하지 않으면 None)
+    """
+    cv2 = camera_devices.load_cv2()
+    times, sizes, scores = [], [], []
+
+    for frame in frames:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ok, buffer = cv2.imencode(codec["ext"], frame, codec["params"])
+            times.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                return None
+        sizes.append(len(buffer))
+
+        if codec["format"] == "png":
+            scores.append(1.0)  # 무손실
+        else:
+            decoded = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            scores.append(ssim(frame, decoded))
+
+    return {
+        "name": codec["name"],
+        "format": codec["format"],
+        "encode_ms": round(float(np.median(times)), 2),
+        "bytes": int(np.mean(sizes)),
+        "ssim": round(min(scores), 4),
+    }
+
+
+def run(frames, codecs=None):
+    """
+    모든 후보 측정
+
+    Args:
+        frames (list): 실제 전송 크기로 줄인 프레임 목록
+
+    Returns:
+        list: measure() 결과 목록 (지원하지 않는 코덱 제외)
+    """
+    results = []
+    for codec in codecs or candidates():
+        try:
+            result = measure(codec, frames)
+        except Exception:
+            result = None
+        if result:
+            results.append(result)
+    return results
+
+
+def select(results, max_bytes=DEFAULT_MAX_BYTES, min_ssim=DEFAULT_MIN_SSIM):
+    """
+    크기/화질 기준을 만족하는 가장 빠른 코덱 이름
+
+    기준을 만족하는 코덱이 없으면 화질 기준만 만족하는 것 중 가장 작은 코덱,
+    그것도 없으면 None
+    """
+    good = [r for r in results if r["ssim"] >= min_ssim]
+    within = [r for r in good if r["bytes"] <= max_bytes]
+    if within:
+        return min(within, key=lambda r: r["encode_ms"])["name"]
+    if good:
+        return min(good, key=lambda r: r["bytes"])["name"]
+    return None
+
+
+def station_info():
+    """결과 비교용 스테이션 정보 (호스트 이름, 라즈베리파이 모델)"""
+    model = platform.machine()
+    try:
+        with open("/proc/device-tree/model", "rb") as f:
+            model = f.read().rstrip(b"\0").decode(errors="replace")
+    except OSError:
+        pass
+    return {"host": socket.gethostname(), "model": model, "cpus": os.cpu_count()}
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+주행 구간 영상 녹화
+app.py의 주행 시작/종료 이벤트 사이에 모든 카메라 프레임을 MJPEG/AVI 파일로 기록
+(카메라 작업 스레드가 읽은 프레임을 그대로 VideoWriter에 전달, 카메라를 따로 열지 않음)
+→ 파일은 로컬에 저장하고 MQTT로는 경로만 알림
+→ 카메라별 파일마다 잠금을 따로 둬서 인코딩이 카메라끼리 서로 기다리지 않음
+→ 실제 카메라 FPS가 설정과 달라도 프레임 시각 기준으로 CLIP_FPS 타임라인에 맞춰 기록
+  (늦게 온 구간은 직전 프레임을 반복, 빠르면 건너뜀 → 재생 시간 = 실제 주행 시간)
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import camera_devices
+
+CLIP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clips")
+CLIP_FOURCC = "MJPG"     # 프레임별 JPEG (인코딩이 가볍고 구간 탐색이 쉬움)
+CLIP_FPS = float(camera_devices.CAMERA_FPS)  # 영상 타임라인 FPS (프레임 시각으로 맞춤)
+CLIP_MAX_SEC = 60        # 종료 이벤트를 못 받아도 이 시간이 지나면 녹화 종료
+CLIP_KEEP = 50           # 보관할 최근 영상 수 (넘으면 오래된 것부터 삭제)
+
+
+class ClipRecorder:
+    """주행 1회 = 영상 1개 (카메라별 파일)"""
+
+    def __init__(self, clip_dir=CLIP_DIR, fps=CLIP_FPS, max_sec=CLIP_MAX_SEC):
+        self.clip_dir = clip_dir
+        self.fps = fps
+        self.max_sec = max_sec
+
+        self._lock = threading.Lock()
+        self._clip_id = None
+        self._started = 0.0
+        self._writers = {}   # 카메라 번호 -> {"lock", "writer", "path", "frames", "source_frames", "first_ts", "last_ts", "closed"}
+        self._cameras = {}   # 카메라 번호 -> 고정 식별자
+        self._on_timeout = None
+
+    def is_recording(self):
+        return self._clip_id is not None
+
+    def start(self, clip_id, cameras, on_timeout=None):
+        """
+        녹화 시작 (파일은 카메라별 첫 프레임이 들어올 때 생성)
+
+        Args:
+            clip_id (str): 영상 ID (파일 이름에 사용)
+            cameras (dict): 카메라 번호 -> 고정 식별자
+            on_timeout (callable): CLIP_MAX_SEC 초과로 자동 종료됐을 때 stop() 결과를 받는 함수
+        """
+        with self._lock:
+            if self._clip_id:
+                return False
+            os.makedirs(self.clip_dir, exist_ok=True)
+            self._clip_id = clip_id
+            self._started = time.time()
+            self._writers = {}
+            self._cameras = dict(cameras)
+            self._on_timeout = on_timeout
+        return True
+
+    def write(self, num, frame, ts):
+        """카메라 작업 스레드에서 프레임마다 호출 (녹화 중이 아니면 바로 반환)"""
+        if self._clip_id is None:
+            return
+
+        expired = False
+        with self._lock:
+            if self._clip_id is None or num not in self._cameras:
+                return
+            if ts - self._started > self.max_sec:
+                expired = True
+            else:
+                entry = self._writers.get(num)
+                if entry is None:
+                    entry = self._writers[num] = self._new_entry(num)
+
+        if expired:
+            callback = self._on_timeout
+            info = self.stop(reason="max_duration")
+            if callback and info:
+                callback(info)
+            return
+
+        # 인코딩은 이 카메라 파일의 잠금에서만 (다른 카메라의 write 와 동시에 실행)
+        with entry["lock"]:
+            if entry["closed"]:
+                return
+            if entry["writer"] is None and not self._open_writer(num, entry, frame):
+                return
+            self._write_paced(entry, frame, ts)
+
+    def _new_entry(self, num):
+        return {
+            "lock": threading.Lock(),
+            "writer": None,
+            "path": os.path.join(self.clip_dir, f"{self._clip_id}-cam{num}.avi"),
+            "frames": 0,          # 파일에 기록한 프레임 (반복 포함)
+            "source_frames": 0,   # 카메라에서 받은 프레임
+            "first_ts": None,
+            "last_ts": None,
+            "closed": False,
+        }
+
+    def _open_writer(self, num, entry, frame):
+        cv2 = camera_devices.load_cv2()
+        h, w = frame.shape[:2]
+        writer = cv2.VideoWriter(entry["path"], cv2.VideoWriter_fourcc(*CLIP_FOURCC), self.fps, (w, h))
+        if not writer.isOpened():
+            entry["closed"] = True
+            with self._lock:
+                self._cameras.pop(num, None)  # 이 카메라는 이번 영상에서 제외
+            return False
+        entry["writer"] = writer
+        return True
+
+    def _write_paced(self, entry, frame, ts):
+        """프레임 시각에 해당하는 타임라인 위치까지 기록 (빈 구간은 같은 프레임 반복)"""
+        if entry["first_ts"] is None:
+            entry["first_ts"] = ts
+        entry["last_ts"] = ts
+        entry["source_frames"] += 1
+        target = int((ts - entry["first_ts"]) * self.fps) + 1
+        while entry["frames"] < target:
+            entry["writer"].write(frame)
+            entry["frames"] += 1
+
+    def stop(self, reason="end"):
+        """
+        녹화 종료
+
+        Returns:
+            dict: 영상 정보 (파일 경로, 프레임 수, 측정 FPS, 크기) 또는 None (녹화 중이 아님)
+        """
+        with self._lock:
+            if self._clip_id is None:
+                return None
+            clip_id, started = self._clip_id, self._started
+            writers, cameras = self._writers, self._cameras
+            self._clip_id = None
+            self._writers = {}
+            self._cameras = {}
+
+        files = []
+        for num, entry in sorted(writers.items()):
+            with entry["lock"]:  # 진행 중인 write 가 끝난 뒤 닫음
+                entry["closed"] = True
+                if entry["writer"] is None:
+                    continue
+                entry["writer"].release()
+            span = (entry["last_ts"] or 0) - (entry["first_ts"] or 0)
+            files.append({
+                "camera": num,
+                "camera_id": cameras.get(num),
+                "path": entry["path"],
+                "frames": entry["frames"],
+                "source_frames": entry["source_frames"],
+                "measured_fps": round((entry["source_frames"] - 1) / span, 1) if span > 0 else None,
+                "bytes": os.path.getsize(entry["path"]) if os.path.exists(entry["path"]) else 0
+            })
+
+        prune(self.clip_dir)
+        return {
+            "clip_id": clip_id,
+            "started_at": started,
+            "duration_sec": round(time.time() - started, 2),
+            "reason": reason,
+            "format": "avi/" + CLIP_FOURCC.lower(),
+            "fps": self.fps,
+            "files": files
+        }
+
+
+def new_clip_id(car_id=None):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return f"drive-{stamp}" + (f"-car{car_id}" if car_id is not None else "")
+
+
+def prune(clip_dir=CLIP_DIR, keep=CLIP_KEEP):
+    """최근 keep개 영상만 남기고 삭제 (카메라별 파일은 같은 영상으로 묶어서 계산)"""
+    try:
+        names = [n for n in os.listdir(clip_dir) if n.endswith(".avi")]
+    except OSError:
+        return
+    clips = sorted({n.rsplit("-cam", 1)[0] for n in names})
+    for old in clips[:-keep] if keep else clips:
+        for name in names:
+            if name.rsplit("-cam", 1)[0] == old:
+                try:
+                    os.remove(os.path.join(clip_dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+공유 메모리 프레임 버스
+camera.py가 읽은 프레임을 multiprocessing.shared_memory 링 버퍼에 기록하고,
+다른 로컬 프로세스(품질 측정, 녹화, 라인/마커 인식 등)는 카메라를 열지 않고 복사 없이 읽음
+
+메모리 구조
+  버스 헤더: magic / 슬롯 수 / 슬롯 크기 / 마지막 기록 seq
+  슬롯     : seq / 촬영 시각 / 카메라 번호 / 높이 / 너비 / 채널 / 데이터 크기 + 프레임 데이터
+
+기록 중인 슬롯은 seq를 0으로 두고, 기록이 끝난 뒤 seq를 씀 (seqlock)
+→ 읽는 쪽은 잠금 없이 자기 커서만 관리하고, 사용 전후 seq가 같은지 확인
+"""
+import struct
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DEFAULT_NAME = "maqueen_frames"
+DEFAULT_SLOTS = 8
+DEFAULT_SLOT_BYTES = 640 * 480 * 3
+
+MAGIC = 0x46424D51  # "QMBF"
+_BUS_HEADER = struct.Struct("<IIIxxxxQ")      # magic, slots, slot_bytes, write_seq
+_SLOT_HEADER = struct.Struct("<QdHHHHI")      # seq, ts, camera, h, w, channels, nbytes
+_SLOT_HEADER_SIZE = 32                         # 8바이트 정렬
+_SEQ = struct.Struct("<Q")
+_WRITE_SEQ_OFFSET = _BUS_HEADER.size - 8
+
+
+_owned = set()  # 이 프로세스의 FrameBusWriter 가 만든 세그먼트 (resource_tracker 등록 유지)
+
+
+def _attach(name):
+    """
+    기존 세그먼트에 붙기 (리더는 세그먼트를 소유하지 않음)
+
+    Python 3.12 이하는 붙기만 해도 resource_tracker 에 등록되어,
+    리더 프로세스가 끝날 때 camera.py가 쓰고 있는 세그먼트를 지워버림
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if name not in _owned:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _slot_offset(slot, slot_bytes):
+    return _BUS_HEADER.size + slot * (_SLOT_HEADER_SIZE + slot_bytes)
+
+
+# ======================
+# 기록 (camera.py)
+# ======================
+class FrameBusWriter:
+    """프레임 링 버퍼에 기록 (한 프로세스 안의 여러 카메라 스레드에서 호출 가능)"""
+
+    def __init__(self, name=DEFAULT_NAME, slots=DEFAULT_SLOTS, slot_bytes=DEFAULT_SLOT_BYTES):
+        size = _BUS_HEADER.size + slots * (_SLOT_HEADER_SIZE + slot_bytes)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # 이전 실행이 비정상 종료되어 남아 있는 경우 재생성
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        _owned.add(name)
+        self.name = name
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.shm.buf[:size] = bytes(size)
+        _BUS_HEADER.pack_into(self.shm.buf, 0, MAGIC, slots, slot_bytes, 0)
+
+    def publish(self, camera, frame, ts=None):
+        """
+        프레임 1장 기록
+
+        Returns:
+            int: 기록한 seq (프레임이 슬롯보다 크면 0)
+        """
+        nbytes = frame.nbytes
+        if nbytes > self.slot_bytes:
+            return 0
+        h, w = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            offset = _slot_offset(seq % self.slots, self.slot_bytes)
+            buf = self.shm.buf
+
+            _SEQ.pack_into(buf, offset, 0)  # 기록 중 표시
+            data = np.ndarray((nbytes,), dtype=np.uint8, buffer=buf,
+                              offset=offset + _SLOT_HEADER_SIZE)
+            data[:] = np.ascontiguousarray(frame).reshape(-1).view(np.uint8)
+            _SLOT_HEADER.pack_into(buf, offset, 0, ts or time.time(), camera, h, w, channels, nbytes)
+            _SEQ.pack_into(buf, offset, seq)
+            _SEQ.pack_into(buf, _WRITE_SEQ_OFFSET, seq)
+        return seq
+
+    def close(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        _owned.discard(self.name)
+
+
+# ======================
+# 읽기 (다른 프로세스)
+# ======================
+class FrameBusReader:
+    """프레임 링 버퍼 읽기 (리더마다 자기 커서를 가짐, 잠금 없음)"""
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.shm = _attach(name)
+        magic, self.slots, self.slot_bytes, _ = _BUS_HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC:
+            self.shm.close()
+            raise ValueError(f"프레임 버스 형식이 아님: {name}")
+        self.cursor = 0
+
+    def write_seq(self):
+        return _SEQ.unpack_from(self.shm.buf, _WRITE_SEQ_OFFSET)[0]
+
+    def _view(self, seq):
+        offset = _slot_offset(seq % self.slots, self.slot_bytes)
+        slot_seq, ts, camera, h, w, channels, nbytes = _SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        if slot_seq != seq:
+            return None
+        shape = (h, w, channels) if channels > 1 else (h, w)
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf,
+                           offset=offset + _SLOT_HEADER_SIZE)
+        return {"seq": seq, "timestamp": ts, "camera": camera, "frame": frame}
+
+    def is_valid(self, seq):
+        """받은 프레임이 아직 덮어써지지 않았는지 확인 (복사 없이 쓴 뒤 호출)"""
+        offset = _slot_offset(seq % self.slots, self.slot_bytes)
+        return _SEQ.unpack_from(self.shm.buf, offset)[0] == seq
+
+    def read_next(self, camera=None):
+        """
+        커서 다음 프레임 (밀렸으면 남아 있는 가장 오래된 프레임부터)
+
+        Returns:
+            dict: {"seq", "timestamp", "camera", "frame"(공유 메모리 뷰)} 또는 None
+        """
+        latest = self.write_seq()
+        start = max(self.cursor + 1, latest - self.slots + 2)
+        for seq in range(start, latest + 1):
+            self.cursor = seq
+            item = self._view(seq)
+            if item and (camera is None or item["camera"] == camera):
+                return item
+        return None
+
+    def read_latest(self, camera=None):
+        """가장 최근 프레임 (중간 프레임은 건너뜀)"""
+        latest = self.write_seq()
+        for seq in range(latest, max(latest - self.slots + 1, 0), -1):
+            item = self._view(seq)
+            if item and (camera is None or item["camera"] == camera):
+                self.cursor = max(self.cursor, seq)
+                return item
+        return None
+
+    def close(self):
+        self.shm.close()
+
+
+if __name__ == "__main__":
+    # 간단한 확인용: python frame_bus.py [버스 이름]
+    reader = FrameBusReader(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_NAME)
+    count, started = 0, time.time()
+    try:
+        while True:
+            item = reader.read_next()
+            if item is None:
+                time.sleep(0.01)
+                continue
+            count += 1
+            if time.time() - started >= 1.0:
+                print(f"{count} fps (seq {item['seq']}, camera {item['camera']}, shape {item['frame'].shape})")
+                count, started = 0, time.time()
+    except KeyboardInterrupt:
+        reader.close()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+프레임 전송 경로 (메모리 재사용)
+기존 경로는 프레임 1장마다 축소 배열 / 인코딩 버퍼 / base64 bytes / str / JSON str / 전송 bytes 를 새로 만듦
+→ 축소 배열은 카메라별로 한 번만 할당해서 재사용 (cv2.resize dst=)
+→ base64 결과를 str/JSON 문자열로 바꾸지 않고 bytearray 하나에 바로 써서 그대로 발행
+
+cv2.imencode 는 출력 버퍼를 받지 않아 인코딩 결과 1개, base64 결과 1개는 그대로 남음
+
+벤치마크:
+    python frame_path.py              # 기존 / 재사용 경로의 촬영 1회당 임시 할당량, 최대 RSS 비교
+"""
+import base64
+import json
+import time
+
+import camera_devices
+
+
+class FrameEncoder:
+    """카메라 1대 전용 인코더 (작업 스레드 하나에서만 호출)"""
+
+    def __init__(self, max_width, codec_source):
+        """
+        Args:
+            max_width (int): 전송 최대 너비
+            codec_source (callable): 현재 코덱 dict 를 돌려주는 함수 (벤치마크로 교체될 수 있음)
+        """
+        self.max_width = max_width
+        self.codec_source = codec_source
+        self._small = None  # 축소 프레임 버퍼 (원본 크기가 바뀔 때만 새로 할당)
+
+    def resize(self, frame):
+        h, w = frame.shape[:2]
+        if w <= self.max_width:
+            return frame
+        shape = (int(h * self.max_width / w), self.max_width) + frame.shape[2:]
+        if self._small is None or self._small.shape != shape:
+            import numpy as np
+            self._small = np.empty(shape, dtype=frame.dtype)
+        cv2 = camera_devices.load_cv2()
+        return cv2.resize(frame, (shape[1], shape[0]), dst=self._small)
+
+    def __call__(self, frame):
+        """
+        Returns:
+            bytes: base64 인코딩된 이미지 (str 로 바꾸지 않음)
+        """
+        current = self.codec_source()
+        cv2 = camera_devices.load_cv2()
+        _, buffer = cv2.imencode(current["ext"], self.resize(frame), current["params"])
+        return base64.b64encode(buffer)
+
+
+def build_images_payload(timestamp, images, image_format, cameras):
+    """
+    send_images_together 와 같은 JSON 을 bytearray 하나에 바로 작성
+
+    Args:
+        images (list): base64 bytes (카메라 번호 순서)
+
+    Returns:
+        bytearray: {"timestamp": ..., "images": [...], "format": ..., "cameras": [...]}
+    """
+    head = b'{"timestamp": ' + json.dumps(timestamp).encode() + b', "images": ['
+    tail = (
+        b'], "format": ' + json.dumps(image_format).encode()
+        + b', "cameras": ' + json.dumps(cameras).encode() + b'}'
+    )
+    size = len(head) + len(tail) + sum(len(img) + 2 for img in images) + max(len(images) - 1, 0) * 2
+
+    payload = bytearray(size)
+    view = memoryview(payload)
+    pos = 0
+    for part in _parts(head, images, tail):
+        view[pos:pos + len(part)] = part
+        pos += len(part)
+    view.release()
+    return payload
+
+
+def _parts(head, images, tail):
+    yield head
+    for i, img in enumerate(images):
+        if i:
+            yield b', '
+        yield b'"'
+        yield img
+        yield b'"'
+    yield tail
+
+
+# =====================
+# 벤치마크
+# =====================
+def legacy_path(frames, codec, max_width):
+    """camera.py 기존 경로 (resize → imencode → b64 → str → json.dumps → utf-8)"""
+    cv2 = camera_devices.load_cv2()
+    images = []
+    for frame in frames:
+        h, w = frame.shape[:2]
+        if w > max_width:
+            frame = cv2.resize(frame, (max_width, int(h * max_width / w)))
+        _, buffer = cv2.imencode(codec["ext"], frame, codec["params"])
+        images.append(base64.b64encode(buffer).decode())
+    payload = {"timestamp": time.time(), "images": images, "format": codec["format"], "cameras": ["a", "b"]}
+    return json.dumps(payload).encode()  # paho 가 str 을 utf-8 bytes 로 변환
+
+
+def reuse_path(encoders, frames, codec):
+    images = [encoder(frame) for encoder, frame in zip(encoders, frames)]
+    return build_images_payload(time.time(), images, codec["format"], ["a", "b"])
+
+
+def _bench_frames():
+    import numpy as np
+    cv2 = camera_devices.load_cv2()
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (0, 0), 3)
+    frames = [base, np.ascontiguousarray(base[:, ::-1])]
+    codec = {"name": "jpeg-85", "format": "jpeg", "ext": ".jpg", "params": [cv2.IMWRITE_JPEG_QUALITY, 85]}
+    return frames, codec
+
+
+def measure(path, count=200, max_width=320):
+    """
+    한 경로만 측정 (최대 RSS 가 섞이지 않도록 경로마다 별도 프로세스에서 실행)
+
+    Returns:
+        dict: 촬영 1회(카메라 전체)당 시간, 임시 할당량(최대치), 최대 RSS
+    """
+    import resource
+    import tracemalloc
+
+    frames, codec = _bench_frames()
+    encoders = [FrameEncoder(max_width, lambda: codec) for _ in frames]
+    if path == "legacy":
+        run = lambda: legacy_path(frames, codec, max_width)
+    else:
+        run = lambda: reuse_path(encoders, frames, codec)
+
+    for _ in range(5):
+        run()  # 버퍼 준비 / 워밍업
+
+    started = time.perf_counter()
+    for _ in range(count):
+        size = len(run())
+    elapsed = time.perf_counter() - started
+
+    # tracemalloc 은 Python 객체와 numpy 배열(cv2 결과 포함) 할당을 추적
+    tracemalloc.start()
+    transient = []
+    for _ in range(min(count, 50)):
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        transient.append(peak - base)
+    tracemalloc.stop()
+
+    return {
+        "path": path,
+        "ms_per_capture": round(elapsed / count * 1000, 3),
+        "payload_bytes": size,
+        "transient_kb_per_capture": round(sum(transient) / len(transient) / 1024, 1),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    import argparse
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description="프레임 전송 경로 메모리 벤치마크")
+    parser.add_argument("--path", choices=["legacy", "reuse"], help="한 경로만 측정 (내부용)")
+    parser.add_argument("--count", type=int, default=200, help="촬영 횟수")
+    args = parser.parse_args()
+
+    if args.path:
+        print(json.dumps(measure(args.path, args.count)))
+        return
+
+    results = []
+    for path in ("legacy", "reuse"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--path", path, "--count", str(args.count)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    keys = ["ms_per_capture", "payload_bytes", "transient_kb_per_capture", "max_rss_kb"]
+    print(f"{'':30}" + "".join(f"{r['path']:>12}" for r in results))
+    for key in keys:
+        print(f"{key:30}" + "".join(f"{r[key]:>12}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+BLE 링크 품질 모니터
+Heartbeat 쓰기 지연 / 실패, 알림 간격으로 링크 점수(0~100)를 계산
+(연결 중에는 스캔을 멈춰서 광고 RSSI가 갱신되지 않으므로 RSSI는 점수에 쓰지 않음)
+→ 주행 전에 링크가 나쁘면 미리 재연결하거나 운영자에게 경고
+"""
+import time
+from collections import deque
+
+WINDOW = 100                 # 최근 N개 Heartbeat 기준
+LATENCY_GOOD_MS = 60         # 이 이하면 감점 없음
+LATENCY_BAD_MS = 400         # 이 이상이면 최대 감점
+GAP_BAD_SEC = 3.0            # 응답을 기다리는 중 알림이 이만큼 없으면 최대 감점
+
+# 전역 변수
+_latencies = deque(maxlen=WINDOW)   # Heartbeat 쓰기 지연 (ms)
+_outcomes = deque(maxlen=WINDOW)    # Heartbeat 성공(1) / 실패(0)
+_consecutive_failures = 0
+_last_notification = None
+_expect_traffic = False             # 점검/주행 중 (micro:bit 응답을 기다리는 중)
+
+
+def reset():
+    """새 연결 시작 시 기록 초기화"""
+    global _consecutive_failures, _last_notification
+    _latencies.clear()
+    _outcomes.clear()
+    _consecutive_failures = 0
+    _last_notification = time.monotonic()
+
+
+# =====================
+# 기록
+# =====================
+def record_write(latency_sec):
+    global _consecutive_failures
+    _latencies.append(latency_sec * 1000)
+    _outcomes.append(1)
+    _consecutive_failures = 0
+
+
+def record_failure():
+    global _consecutive_failures
+    _outcomes.append(0)
+    _consecutive_failures += 1
+
+
+def record_notification():
+    global _last_notification
+    _last_notification = time.monotonic()
+
+
+def set_expect_traffic(expect):
+    """점검/주행 중에만 알림 간격을 점수에 반영"""
+    global _expect_traffic
+    _expect_traffic = expect
+    if expect:
+        record_notification()
+
+
+def consecutive_failures():
+    return _consecutive_failures
+
+
+# =====================
+# 점수
+# =====================
+def _percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _penalty(value, good, bad):
+    """good → 0, bad → 1 사이 선형 감점 비율"""
+    if value is None:
+        return 0.0
+    if bad > good:
+        return min(max((value - good) / (bad - good), 0.0), 1.0)
+    return min(max((good - value) / (good - bad), 0.0), 1.0)
+
+
+def snapshot():
+    """
+    현재 링크 상태
+
+    Returns:
+        dict: 지연 백분위(ms), 실패율, 알림 간격, 점수
+    """
+    gap = time.monotonic() - _last_notification if _last_notification else None
+    failure_rate = 1 - sum(_outcomes) / len(_outcomes) if _outcomes else 0.0
+    p95 = _percentile(_latencies, 95)
+
+    score = 100.0
+    score -= 45 * _penalty(p95, LATENCY_GOOD_MS, LATENCY_BAD_MS)
+    score -= 35 * min(failure_rate * 5, 1.0)  # 실패 20%면 최대 감점
+    if _expect_traffic:
+        score -= 20 * _penalty(gap, 0.0, GAP_BAD_SEC)
+    if _consecutive_failures:
+        score = min(score, 30.0)
+
+    return {
+        "score": int(round(score)),
+        "latency_p50_ms": _round(_percentile(_latencies, 50)),
+        "latency_p95_ms": _round(p95),
+        "latency_p99_ms": _round(_percentile(_latencies, 99)),
+        "failure_rate": round(failure_rate, 3),
+        "consecutive_failures": _consecutive_failures,
+        "notification_gap_sec": _round(gap),
+        "samples": len(_outcomes),
+    }
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
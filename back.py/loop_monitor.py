@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+이벤트 루프 지연 모니터 / 실행 중 프로파일링
+- 일정 주기로 sleep 했을 때 실제로 늦게 깨어난 시간(스케줄링 지연)을 측정
+- 감시 스레드가 루프가 기준 시간 이상 멈춰 있으면 그 순간 루프 스레드의 스택을 기록
+  → 어떤 콜백이 루프를 막고 있는지 확인 가능
+- cProfile / tracemalloc 을 재시작 없이 켜고 끄고, 결과를 파일로 저장
+"""
+import asyncio
+import cProfile
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from datetime import datetime
+
+SAMPLE_INTERVAL = 0.1     # 지연 측정 주기 (초)
+PUBLISH_INTERVAL = 5.0    # 통계 발행 주기 (초)
+SLOW_THRESHOLD = 0.1      # 이보다 오래 루프를 막으면 느린 콜백으로 기록 (초)
+MAX_SLOW_RECORDS = 5      # 발행 1회에 포함할 느린 콜백 수
+CONTROL_TIMEOUT = 5.0     # 루프 스레드에서 제어 명령 실행을 기다리는 최대 시간 (초)
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+
+# 전역 변수
+_loop = None
+_loop_thread_id = None
+_last_tick = 0.0
+_max_lag = 0.0
+_lag_sum = 0.0
+_lag_count = 0
+_slow = []               # [{"blocked_ms", "stack"}, ...]
+_stall_reported = False
+_lock = threading.Lock()
+
+_profiler = None
+
+
+# =====================
+# 지연 측정
+# =====================
+async def _sampler(publish):
+    global _last_tick, _max_lag, _lag_sum, _lag_count
+    last_publish = time.monotonic()
+
+    while True:
+        expected = time.monotonic() + SAMPLE_INTERVAL
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        now = time.monotonic()
+        lag = max(0.0, now - expected)
+
+        with _lock:
+            _last_tick = now
+            _max_lag = max(_max_lag, lag)
+            _lag_sum += lag
+            _lag_count += 1
+
+        if now - last_publish >= PUBLISH_INTERVAL:
+            last_publish = now
+            publish(collect())
+
+
+def collect():
+    """
+    지난 발행 이후 통계를 돌려주고 초기화
+
+    Returns:
+        dict: 최대/평균 지연(ms), 느린 콜백 목록
+    """
+    global _max_lag, _lag_sum, _lag_count, _slow
+    with _lock:
+        stats = {
+            "timestamp": time.time(),
+            "max_lag_ms": round(_max_lag * 1000, 1),
+            "avg_lag_ms": round(_lag_sum / _lag_count * 1000, 2) if _lag_count else 0.0,
+            "samples": _lag_count,
+            "slow_callbacks": _slow[:MAX_SLOW_RECORDS],
+            "slow_count": len(_slow),
+            "profiling": _profiler is not None,
+            "tracemalloc": tracemalloc.is_tracing(),
+        }
+        _max_lag = _lag_sum = 0.0
+        _lag_count = 0
+        _slow = []
+    return stats
+
+
+def _watchdog():
+    """루프가 SLOW_THRESHOLD 이상 응답이 없으면 루프 스레드의 현재 스택 기록"""
+    global _stall_reported
+    while True:
+        time.sleep(SLOW_THRESHOLD / 2)
+        with _lock:
+            blocked = time.monotonic() - _last_tick - SAMPLE_INTERVAL
+        if blocked < SLOW_THRESHOLD:
+            _stall_reported = False
+            continue
+        if _stall_reported:
+            continue  # 같은 정지는 한 번만 기록
+
+        frame = sys._current_frames().get(_loop_thread_id)
+        stack = traceback.format_stack(frame, limit=8) if frame else []
+        with _lock:
+            _slow.append({
+                "blocked_ms": round(blocked * 1000, 1),
+                "stack": [line.strip() for line in stack],
+            })
+        _stall_reported = True
+
+
+def start(loop, publish):
+    """
+    모니터 시작 (루프 스레드에서 호출)
+
+    Args:
+        loop: 감시할 asyncio 루프
+        publish (callable): 통계 dict 를 받아 발행하는 함수
+    """
+    global _loop, _loop_thread_id, _last_tick
+    _loop = loop
+    _loop_thread_id = threading.get_ident()
+    _last_tick = time.monotonic()
+    threading.Thread(target=_watchdog, daemon=True).start()
+    return loop.create_task(_sampler(publish))
+
+
+# =====================
+# 프로파일링 (실행 중 켜고 끄기)
+# =====================
+def _dump_path(prefix, ext):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{ext}")
+
+
+def _run_in_loop(func, timeout=CONTROL_TIMEOUT):
+    """
+    루프 스레드에서 실행하고 결과 반환 (cProfile 은 호출한 스레드만 측정)
+
+    Raises:
+        TimeoutError: 루프가 막혀 있어서 timeout 안에 실행되지 않음 (나중에 실행될 수는 있음)
+    """
+    if threading.get_ident() == _loop_thread_id:
+        return func()
+    done = threading.Event()
+    result = {}
+
+    def call():
+        try:
+            result["value"] = func()
+        except Exception as e:
+            result["error"] = e
+        done.set()
+
+    _loop.call_soon_threadsafe(call)
+    if not done.wait(timeout):
+        raise TimeoutError(f"event loop did not respond within {timeout:g}s")
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+
+def _cprofile_start():
+    global _profiler
+    if _profiler:
+        return None
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+    return None
+
+
+def _cprofile_stop():
+    global _profiler
+    if not _profiler:
+        return None
+    _profiler.disable()
+    path = _dump_path("profile", "prof")
+    _profiler.dump_stats(path)  # python -m pstats <파일> 로 확인
+    _profiler = None
+    return path
+
+
+def _tracemalloc_stop(top=30):
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    path = _dump_path("tracemalloc", "txt")
+    with open(path, "w", encoding="utf-8") as f:
+        for stat in snapshot.statistics("lineno")[:top]:
+            f.write(f"{stat}\n")
+    snapshot.dump(path[:-len(".txt")] + ".snap")
+    return path
+
+
+def handle_control(command):
+    """
+    프로파일링 제어 명령 처리
+
+    Args:
+        command (str): cprofile_start / cprofile_stop / tracemalloc_start / tracemalloc_stop
+
+    Returns:
+        dict: {"command", "ok", "path"(저장한 파일)} 또는 {"command", "error"}
+    """
+    try:
+        return _handle_control(command)
+    except TimeoutError as e:
+        # 루프가 막혀 있으면 명령은 대기열에 남아 나중에 실행될 수 있음 (cprofile_stop 파일은 PROFILE_DIR 에 저장됨)
+        return {"command": command, "error": f"timeout: {e}", "pending": True}
+
+
+def _handle_control(command):
+    if command == "cprofile_start":
+        _run_in_loop(_cprofile_start)
+        return {"command": command, "ok": True}
+    if command == "cprofile_stop":
+        return {"command": command, "ok": True, "path": _run_in_loop(_cprofile_stop)}
+    if command == "tracemalloc_start":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        return {"command": command, "ok": True}
+    if command == "tracemalloc_stop":
+        return {"command": command, "ok": True, "path": _tracemalloc_stop()}
+    return {"command": command, "error": "unknown command"}
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+트래픽 기록 재생 (회귀 테스트)
+traffic_trace로 기록한 BLE 알림 / MQTT 수신 메시지를 실제 app.py 로직에 그대로 다시 넣고,
+가짜 BLE / MQTT 클라이언트로 나온 결과를 기록된 결과와 비교
+
+사용법:
+    python replay.py logs/app-20250101-120000.trace            # 1배속
+    python replay.py logs/app-20250101-120000.trace --speed 20 # 20배속
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import traffic_trace
+
+# 비교할 때 무시하는 값 (실행할 때마다 달라짐)
+VOLATILE_KEYS = {"timestamp", "elapsed_ms", "captured_at", "age_ms", "last_seen", "duration_ms"}
+DEFAULT_TOPICS = ("sensor/result",)
+GRACE_SEC = 25.0  # 마지막 레코드 이후 대기 (주행 응답 대기 20초 포함)
+
+
+# =====================
+# 가짜 전송 계층
+# =====================
+class ScaledAsyncio:
+    """app / bluetooth_manager 의 asyncio 대신 사용 (sleep만 배속, 나머지는 그대로)"""
+
+    def __init__(self, speed):
+        self.speed = speed
+
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+
+    async def sleep(self, delay, result=None):
+        return await asyncio.sleep(delay / self.speed, result)
+
+
+class FakeMqttClient:
+    """발행 메시지만 모아두는 MQTT 클라이언트"""
+
+    def __init__(self):
+        self.published = []
+        self.on_message = None
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.published.append((topic, payload))
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def subscribe(self, *args, **kwargs):
+        pass
+
+    def unsubscribe(self, *args, **kwargs):
+        pass
+
+    def will_set(self, *args, **kwargs):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+
+class FakeBleakClient:
+    """micro:bit 대신 쓰기 내용만 모아두는 BLE 클라이언트"""
+
+    def __init__(self):
+        self.is_connected = True
+        self.writes = []
+
+    async def write_gatt_char(self, uuid, data, response=None):
+        self.writes.append(bytes(data))
+
+    async def disconnect(self):
+        self.is_connected = False
+
+
+class FakeMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+# =====================
+# 비교
+# =====================
+def normalize(payload):
+    """JSON이면 실행마다 바뀌는 값을 빼고 정렬된 문자열로"""
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8", "replace")
+    try:
+        data = json.loads(payload)
+    except (TypeError, ValueError):
+        return payload
+
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    return json.dumps(strip(data), sort_keys=True, ensure_ascii=False)
+
+
+def is_link_write(data):
+    """Heartbeat / 연결 시 간격 협상은 비교에서 제외 (가짜 연결에서는 보내지 않음)"""
+    data = data.strip()
+    return data == b"HB" or data.startswith(b"CFG:HB_INTERVAL=")
+
+
+def compare(expected, actual):
+    """순서대로 비교, 다른 항목 목록 반환"""
+    diffs = []
+    for i in range(max(len(expected), len(actual))):
+        e = expected[i] if i < len(expected) else None
+        a = actual[i] if i < len(actual) else None
+        if e != a:
+            diffs.append((i, e, a))
+    return diffs
+
+
+# =====================
+# 재생
+# =====================
+def replay(path, speed=1.0, topics=DEFAULT_TOPICS):
+    """
+    기록 파일을 app.py에 재생
+
+    Returns:
+        dict: 재생 시간, 비교 결과
+    """
+    records = traffic_trace.read(path)
+
+    import app
+    import bluetooth_manager as bt
+    import link_monitor
+    import result_store
+
+    result_store.open_store(":memory:")  # 실제 결과 DB에 기록하지 않음
+    scaled = ScaledAsyncio(speed)
+    app.asyncio = scaled
+    bt.asyncio = scaled
+
+    fake_mqtt = FakeMqttClient()
+    fake_ble = FakeBleakClient()
+    app.mqtt_client = fake_mqtt
+
+    async def fake_connect(max_retries=7, address=None):
+        bt._client = fake_ble
+        link_monitor.reset()
+        bt._hb_task = asyncio.create_task(bt._heartbeat_loop())
+        return True
+
+    bt.connect = fake_connect
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    app.loop = loop
+
+    async def feed():
+        main_task = asyncio.create_task(app.main())
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        for t, kind, topic, data in records:
+            delay = t / speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if kind == traffic_trace.BLE_NOTIFY:
+                bt._internal_notification_handler(None, bytearray(data))
+            elif kind == traffic_trace.MQTT_IN:
+                app.on_message(fake_mqtt, None, FakeMessage(topic, data))
+        await asyncio.sleep(GRACE_SEC / speed)
+        main_task.cancel()
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    started = time.monotonic()
+    try:
+        loop.run_until_complete(feed())
+    finally:
+        loop.close()
+    wall = time.monotonic() - started
+
+    expected = [
+        (topic, normalize(data)) for _, kind, topic, data in records
+        if kind == traffic_trace.MQTT_OUT and topic in topics
+    ]
+    actual = [
+        (topic, normalize(payload)) for topic, payload in fake_mqtt.published
+        if topic in topics
+    ]
+    expected_writes = [
+        data for _, kind, _, data in records
+        if kind == traffic_trace.BLE_WRITE and not is_link_write(data)
+    ]
+    actual_writes = [w for w in fake_ble.writes if not is_link_write(w)]
+
+    return {
+        "records": len(records),
+        "trace_sec": records[-1][0] if records else 0.0,
+        "wall_sec": wall,
+        "mqtt_diffs": compare(expected, actual),
+        "ble_diffs": compare(expected_writes, actual_writes),
+        "mqtt_count": len(actual),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BLE/MQTT 트래픽 기록 재생")
+    parser.add_argument("trace", help="traffic_trace 기록 파일")
+    parser.add_argument("--speed", type=float, default=1.0, help="재생 배속 (기본 1배)")
+    parser.add_argument("--topic", action="append", help="비교할 MQTT 토픽 (여러 번 지정 가능)")
+    args = parser.parse_args()
+
+    result = replay(args.trace, args.speed, tuple(args.topic) if args.topic else DEFAULT_TOPICS)
+
+    print(f"\n📼 재생 완료: 레코드 {result['records']}개, "
+          f"기록 {result['trace_sec']:.1f}초 → 재생 {result['wall_sec']:.1f}초")
+    for name, diffs in (("MQTT", result["mqtt_diffs"]), ("BLE 명령", result["ble_diffs"])):
+        if not diffs:
+            print(f"✅ {name} 일치")
+            continue
+        print(f"❌ {name} 불일치 {len(diffs)}건")
+        for i, expected, actual in diffs[:20]:
+            print(f"   #{i} 기록: {expected}")
+            print(f"   #{i} 재생: {actual}")
+
+    sys.exit(1 if result["mqtt_diffs"] or result["ble_diffs"] else 0)
+
+
+if __name__ == "__main__":
+    main()
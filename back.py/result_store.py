@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+점검 결과 로컬 저장소
+모든 점검/주행 결과와 소요 시간을 SQLite에 기록하고,
+오래된 데이터는 시간 단위 집계(rollup)와 차량별 결과 건수로 줄여서 보관
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 저장 위치 / 보관 정책
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.db")
+RAW_RETENTION_SEC = 7 * 24 * 3600   # 원본 데이터 보관 기간 (7일)
+CAR_RETENTION_SEC = 90 * 24 * 3600  # 차량별 결과 건수 보관 기간 (90일, 이후는 시간 단위 집계만 남음)
+ROLLUP_BUCKET_SEC = 3600            # 집계 단위 (1시간)
+ROLLUP_EVERY = 500                  # 기록 N건마다 자동 집계
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cars (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts          REAL NOT NULL,
+    car_id      INTEGER,
+    device      TEXT NOT NULL,
+    result      TEXT NOT NULL,
+    duration_ms REAL,
+    detail      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_ts ON results (ts);
+CREATE INDEX IF NOT EXISTS idx_results_device_ts ON results (device, ts);
+CREATE INDEX IF NOT EXISTS idx_results_car_device ON results (car_id, device);
+CREATE TABLE IF NOT EXISTS rollups (
+    bucket_start    REAL NOT NULL,
+    device          TEXT NOT NULL,
+    result          TEXT NOT NULL,
+    count           INTEGER NOT NULL,
+    sum_duration_ms REAL NOT NULL,
+    max_duration_ms REAL NOT NULL,
+    PRIMARY KEY (bucket_start, device, result)
+);
+CREATE TABLE IF NOT EXISTS car_outcomes (
+    car_id  INTEGER NOT NULL,
+    device  TEXT NOT NULL,
+    total   INTEGER NOT NULL,
+    defect  INTEGER NOT NULL,
+    timeout INTEGER NOT NULL,
+    PRIMARY KEY (car_id, device)
+);
+"""
+
+_conn = None
+_lock = threading.Lock()
+_inserts_since_rollup = 0
+
+
+def open_store(path=DB_PATH):
+    """저장소 열기 (없으면 생성)"""
+    global _conn
+    with _lock:
+        if _conn is None:
+            # MQTT 콜백 스레드와 asyncio 스레드에서 함께 사용
+            _conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            _conn.executescript(_SCHEMA)
+    return _conn
+
+
+def close_store():
+    """저장소 닫기"""
+    global _conn
+    with _lock:
+        if _conn:
+            _conn.close()
+            _conn = None
+
+
+def new_car():
+    """
+    새 점검 대상(차량) 등록
+
+    Returns:
+        int: 차량 ID
+    """
+    conn = open_store()
+    with _lock:
+        cur = conn.execute("INSERT INTO cars (started_at) VALUES (?)", (time.time(),))
+        return cur.lastrowid
+
+
+def current_car():
+    """가장 최근에 등록된 차량 ID (없으면 None)"""
+    conn = open_store()
+    with _lock:
+        row = conn.execute("SELECT MAX(id) FROM cars").fetchone()
+    return row[0]
+
+
+def record(device, result, duration_ms=None, car_id=None, detail=None):
+    """
+    점검 결과 한 건 기록
+
+    Args:
+        device (str): 장치 이름 (LED, BUZZER, ULTRASONIC, WHEEL)
+        result (str): 결과 (OK, DEFECT, timeout ...)
+        duration_ms (float): 명령 전송부터 결과 수신까지 걸린 시간
+        car_id (int): 차량 ID (None이면 가장 최근 차량)
+        detail (dict): 추가 정보 (주행 진단 등)
+    """
+    global _inserts_since_rollup
+    conn = open_store()
+    if car_id is None:
+        car_id = current_car()
+
+    with _lock:
+        conn.execute(
+            "INSERT INTO results (ts, car_id, device, result, duration_ms, detail) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (time.time(), car_id, device, result, duration_ms,
+             json.dumps(detail) if detail else None)
+        )
+        _inserts_since_rollup += 1
+        need_rollup = _inserts_since_rollup >= ROLLUP_EVERY
+
+    if need_rollup:
+        rollup()
+
+
+def rollup(now=None):
+    """
+    보관 기간이 지난 원본 데이터를 시간 단위 집계(응답 시간)와 차량별 결과 건수(불량률)로 옮기고 삭제
+    CAR_RETENTION_SEC 가 지난 차량의 결과 건수와 차량 기록도 삭제
+    (원본을 옮길 때 시간 단위 집계에도 이미 더해졌으므로 장치별 건수는 rollups 에 남음)
+
+    Returns:
+        int: 집계 후 삭제된 원본 건수
+    """
+    global _inserts_since_rollup
+    conn = open_store()
+    now = now or time.time()
+    cutoff = now - RAW_RETENTION_SEC
+    car_cutoff = now - CAR_RETENTION_SEC
+
+    with _lock:
+        _inserts_since_rollup = 0
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                """
+                INSERT INTO rollups (bucket_start, device, result, count, sum_duration_ms, max_duration_ms)
+                SELECT CAST(ts / :bucket AS INTEGER) * :bucket, device, result,
+                       COUNT(*), TOTAL(duration_ms), IFNULL(MAX(duration_ms), 0)
+                FROM results WHERE ts < :cutoff
+                GROUP BY 1, device, result
+                ON CONFLICT (bucket_start, device, result) DO UPDATE SET
+                    count = count + excluded.count,
+                    sum_duration_ms = sum_duration_ms + excluded.sum_duration_ms,
+                    max_duration_ms = MAX(max_duration_ms, excluded.max_duration_ms)
+                """,
+                {"bucket": ROLLUP_BUCKET_SEC, "cutoff": cutoff}
+            )
+            conn.execute(
+                """
+                INSERT INTO car_outcomes (car_id, device, total, defect, timeout)
+                SELECT car_id, device, COUNT(*), TOTAL(result = 'DEFECT'), TOTAL(result = 'timeout')
+                FROM results WHERE ts < :cutoff AND car_id IS NOT NULL
+                GROUP BY car_id, device
+                ON CONFLICT (car_id, device) DO UPDATE SET
+                    total = total + excluded.total,
+                    defect = defect + excluded.defect,
+                    timeout = timeout + excluded.timeout
+                """,
+                {"cutoff": cutoff}
+            )
+            deleted = conn.execute("DELETE FROM results WHERE ts < ?", (cutoff,)).rowcount
+            # 가장 최근 차량은 남겨서 current_car() / 불량률 차량 범위가 유지되도록
+            old_cars = "SELECT id FROM cars WHERE started_at < ? AND id < (SELECT MAX(id) FROM cars)"
+            conn.execute(f"DELETE FROM car_outcomes WHERE car_id IN ({old_cars})", (car_cutoff,))
+            conn.execute(
+                f"DELETE FROM cars WHERE id IN ({old_cars}) "
+                "AND id NOT IN (SELECT car_id FROM results WHERE car_id IS NOT NULL)",
+                (car_cutoff,)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return deleted
+
+
+# =====================
+# 조회
+# =====================
+def defect_rate(device, last_cars=1000):
+    """
+    최근 N대 차량 기준 장치 불량률 (원본 + 차량별 집계 포함)
+
+    Returns:
+        dict: 전체/불량/timeout 건수와 불량률, 실제로 결과가 있는 차량 수와 차량 ID 범위
+    """
+    conn = open_store()
+    with _lock:
+        first = conn.execute("SELECT IFNULL(MAX(id), 0) FROM cars").fetchone()[0] - last_cars
+        row = conn.execute(
+            """
+            SELECT TOTAL(total), TOTAL(defect), TOTAL(timeout),
+                   COUNT(DISTINCT car_id), MIN(car_id), MAX(car_id)
+            FROM (
+                SELECT car_id, 1 AS total, result = 'DEFECT' AS defect, result = 'timeout' AS timeout
+                FROM results WHERE device = :device AND car_id > :first
+                UNION ALL
+                SELECT car_id, total, defect, timeout
+                FROM car_outcomes WHERE device = :device AND car_id > :first
+            )
+            """,
+            {"device": device, "first": first}
+        ).fetchone()
+    total, defect, timeout = int(row[0]), int(row[1]), int(row[2])
+    return {
+        "device": device,
+        "last_cars": last_cars,
+        "cars": row[3],        # 이 장치 결과가 있는 차량 수 (last_cars 보다 적을 수 있음)
+        "car_from": row[4],
+        "car_to": row[5],
+        "total": total,
+        "defect": defect,
+        "timeout": timeout,
+        "defect_rate": round(defect / total, 4) if total else None,
+    }
+
+
+def timings(device, since_sec=3600):
+    """
+    최근 기간 동안 장치 응답 시간 통계 (원본 + 집계 포함)
+
+    Returns:
+        dict: 건수, 평균/최대 소요 시간(ms)
+    """
+    conn = open_store()
+    since = time.time() - since_sec
+    with _lock:
+        raw = conn.execute(
+            "SELECT COUNT(duration_ms), TOTAL(duration_ms), IFNULL(MAX(duration_ms), 0) "
+            "FROM results WHERE device = ? AND ts >= ?",
+            (device, since)
+        ).fetchone()
+        rolled = conn.execute(
+            "SELECT TOTAL(count), TOTAL(sum_duration_ms), IFNULL(MAX(max_duration_ms), 0) "
+            "FROM rollups WHERE device = ? AND bucket_start >= ?",
+            (device, since)
+        ).fetchone()
+    count = raw[0] + int(rolled[0])
+    return {
+        "device": device,
+        "since_sec": since_sec,
+        "count": count,
+        "avg_ms": round((raw[1] + rolled[1]) / count, 1) if count else None,
+        "max_ms": max(raw[2], rolled[2]) if count else None,
+    }
+
+
+def recent(limit=20, device=None):
+    """최근 기록 목록 (최신순)"""
+    conn = open_store()
+    sql = "SELECT ts, car_id, device, result, duration_ms, detail FROM results"
+    args = ()
+    if device:
+        sql += " WHERE device = ?"
+        args = (device,)
+    sql += " ORDER BY ts DESC LIMIT ?"
+    with _lock:
+        rows = conn.execute(sql, args + (limit,)).fetchall()
+    return [
+        {
+            "ts": ts,
+            "car_id": car_id,
+            "device": dev,
+            "result": result,
+            "duration_ms": duration_ms,
+            "detail": json.loads(detail) if detail else None,
+        }
+        for ts, car_id, dev, result, duration_ms, detail in rows
+    ]
+
+
+def query(request):
+    """
+    MQTT 조회 요청 처리
+
+    Args:
+        request (dict): {"query": "defect_rate" | "timings" | "recent", ...}
+
+    Returns:
+        dict: 조회 결과 (알 수 없는 요청이면 error)
+    """
+    kind = request.get("query")
+    start = time.perf_counter()
+
+    if kind == "defect_rate":
+        data = defect_rate(request["device"], int(request.get("last_cars", 1000)))
+    elif kind == "timings":
+        data = timings(request["device"], float(request.get("since_sec", 3600)))
+    elif kind == "recent":
+        data = recent(int(request.get("limit", 20)), request.get("device"))
+    else:
+        return {"error": f"unknown query: {kind}"}
+
+    return {
+        "data": data,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+논블로킹 로그 모듈
+호출한 쪽은 큐에 넣기만 하고, 포맷/출력은 백그라운드 스레드에서 처리
+- 자주 발생하는 로그(알림, heartbeat 등)는 위치(site)별 속도 제한 / 샘플링
+- ring 모드: 출력 대신 고정 크기 바이너리 링 버퍼에 기록, 필요할 때 덤프
+"""
+import atexit
+import os
+import queue
+import signal
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+# 출력 모드
+MODE_STREAM = "stream"  # stdout 출력
+MODE_RING = "ring"      # 링 버퍼에만 기록 (ERROR는 항상 출력)
+
+QUEUE_SIZE = 4096
+RING_SLOTS = 4096
+RING_SLOT_SIZE = 256
+DUMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# 링 버퍼 레코드: 시각(f64) / 레벨(u8) / 길이(u16) / UTF-8 메시지
+_RECORD = struct.Struct("<dBH")
+_MAX_TEXT = RING_SLOT_SIZE - _RECORD.size
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_mode = os.environ.get("STATION_LOG_MODE", MODE_STREAM)
+_dropped = 0
+_sites = {}  # site -> [남은 토큰, 마지막 충전 시각, 호출 횟수, 생략 건수]
+_sites_lock = threading.Lock()
+
+_ring = bytearray(RING_SLOTS * RING_SLOT_SIZE)
+_ring_seq = 0
+_ring_lock = threading.Lock()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+# ======================
+# 기록
+# ======================
+def log(msg, level="INFO"):
+    """로그 한 건을 큐에 넣고 바로 반환 (큐가 가득 차면 버림)"""
+    global _dropped
+    _ensure_writer()
+    try:
+        _queue.put_nowait((time.time(), level, msg))
+    except queue.Full:
+        _dropped += 1
+
+
+def log_sampled(site, msg, level="DEBUG", rate=1.0, burst=5, every=1):
+    """
+    자주 호출되는 위치용 로그 (속도 제한 + 샘플링)
+
+    Args:
+        site (str): 호출 위치 이름 (예: "ble.notify")
+        rate (float): 초당 허용 건수
+        burst (int): 한 번에 허용하는 최대 건수
+        every (int): N번 호출마다 1건만 기록
+    """
+    now = time.monotonic()
+    with _sites_lock:
+        state = _sites.get(site)
+        if state is None:
+            state = _sites[site] = [float(burst), now, 0, 0]
+
+        state[0] = min(burst, state[0] + (now - state[1]) * rate)
+        state[1] = now
+        state[2] += 1
+        if state[2] % every or state[0] < 1:
+            state[3] += 1
+            return
+        state[0] -= 1
+        suppressed, state[3] = state[3], 0
+
+    if suppressed:
+        msg = f"{msg} (+{suppressed}건 생략)"
+    log(msg, level)
+
+
+def set_mode(mode):
+    """출력 모드 변경 (MODE_STREAM / MODE_RING)"""
+    global _mode
+    _mode = mode
+
+
+# ======================
+# 백그라운드 출력
+# ======================
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, daemon=True)
+            _writer.start()
+
+
+def _format(ts, level, msg):
+    return f"[{datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')}] [{level}] {msg}\n"
+
+
+def _writer_loop():
+    global _dropped
+    while True:
+        item = _queue.get()
+        lines = []
+        # 쌓여 있는 로그를 한 번에 모아서 출력
+        while item is not None:
+            ts, level, msg = item
+            if _mode == MODE_RING:
+                _ring_write(ts, level, msg)
+                if level == "ERROR":
+                    lines.append(_format(ts, level, msg))
+            else:
+                lines.append(_format(ts, level, msg))
+            _queue.task_done()
+            try:
+                item = _queue.get_nowait()
+            except queue.Empty:
+                item = None
+
+        if _dropped:
+            lines.append(_format(time.time(), "WARNING", f"로그 큐 가득 참: {_dropped}건 버림"))
+            _dropped = 0
+        if lines:
+            try:
+                sys.stdout.write("".join(lines))
+                sys.stdout.flush()
+            except Exception:
+                pass
+
+
+def flush(timeout=1.0):
+    """큐에 남은 로그가 출력될 때까지 대기 (최대 timeout초)"""
+    deadline = time.time() + timeout
+    while _queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.01)
+
+
+atexit.register(flush)
+
+
+# ======================
+# 링 버퍼
+# ======================
+def _ring_write(ts, level, msg):
+    global _ring_seq
+    text = msg.encode("utf-8")[:_MAX_TEXT]
+    with _ring_lock:
+        offset = (_ring_seq % RING_SLOTS) * RING_SLOT_SIZE
+        _RECORD.pack_into(_ring, offset, ts, LEVELS.index(level) if level in LEVELS else 1, len(text))
+        _ring[offset + _RECORD.size:offset + _RECORD.size + len(text)] = text
+        _ring_seq += 1
+
+
+def read_ring():
+    """링 버퍼 내용을 오래된 순서대로 (시각, 레벨, 메시지) 목록으로 반환"""
+    with _ring_lock:
+        data = bytes(_ring)
+        seq = _ring_seq
+
+    records = []
+    for i in range(max(0, seq - RING_SLOTS), seq):
+        offset = (i % RING_SLOTS) * RING_SLOT_SIZE
+        ts, level, length = _RECORD.unpack_from(data, offset)
+        text = data[offset + _RECORD.size:offset + _RECORD.size + length]
+        records.append((ts, LEVELS[level], text.decode("utf-8", "replace")))
+    return records
+
+
+def dump_ring(path=None):
+    """
+    링 버퍼를 텍스트 파일로 저장
+
+    Returns:
+        str: 저장한 파일 경로
+    """
+    if path is None:
+        os.makedirs(DUMP_DIR, exist_ok=True)
+        path = os.path.join(DUMP_DIR, f"ring-{datetime.now().strftime('%Y%m%d-%H%M%S')}.log")
+    with open(path, "w", encoding="utf-8") as f:
+        for ts, level, msg in read_ring():
+            f.write(_format(ts, level, msg))
+    return path
+
+
+def install_dump_signal(sig=getattr(signal, "SIGUSR1", None)):
+    """시그널(기본 SIGUSR1)을 받으면 링 버퍼 덤프 (메인 스레드에서 호출)"""
+    if sig is None:
+        return
+
+    def _handler(signum, frame):
+        # 시그널 핸들러 안에서는 파일 쓰기만 별도 스레드로 넘김
+        threading.Thread(target=lambda: log(f"링 버퍼 덤프: {dump_ring()}"), daemon=True).start()
+
+    signal.signal(sig, _handler)
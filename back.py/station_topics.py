@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+스테이션 토픽 이름 / 작업 분산
+- STATION_ID 가 있으면 이 스테이션의 토픽을 "stations/<ID>/..." 아래로 분리
+  → 브로커 하나에 스테이션이 여러 대 있어도 서로의 명령을 받지 않음
+- STATION_GROUP 이 있으면 점검 명령을 MQTT v5 공유 구독("$share/<그룹>/ult01")으로 받음
+  → 브로커가 같은 그룹의 라즈베리파이들에게 점검을 나눠서 전달 (작업 가능한 스테이션만 구독)
+  → 주행 명령(ult02)은 그룹 전체가 받고, 그룹 대기열(pool/<그룹>/queue/<스테이션>, retain)의 맨 앞
+    (가장 먼저 점검을 끝낸 차량이 있는 스테이션)만 주행 → 같은 차량의 점검과 주행이 같은 스테이션에서 진행
+  → 대기 상태는 스테이션마다 retain 으로 남기므로 재시작/재연결한 스테이션도 같은 대기열을 다시 받음
+- 둘 다 없으면 기존 전역 토픽 그대로 사용
+"""
+import os
+import socket
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+ENV_STATION_ID = "STATION_ID"
+ENV_STATION_GROUP = "STATION_GROUP"
+PREFIX = "stations"
+REQUEUE_PROPERTY = "requeue"  # 바쁜 스테이션이 그룹에 되돌려 보낸 횟수 (MQTT v5 사용자 속성)
+
+STATION_ID = os.environ.get(ENV_STATION_ID) or None
+STATION_GROUP = os.environ.get(ENV_STATION_GROUP) or None
+
+
+def station_name():
+    """상태 메시지에 넣을 스테이션 이름 (STATION_ID 가 없으면 호스트 이름)"""
+    return STATION_ID or socket.gethostname()
+
+
+def create_client():
+    """공유 구독을 쓰면 MQTT v5, 아니면 기존과 같은 v3.1.1 클라이언트"""
+    if STATION_GROUP:
+        return mqtt.Client(protocol=mqtt.MQTTv5)
+    return mqtt.Client()
+
+
+# =====================
+# 토픽 이름
+# =====================
+def out(topic):
+    """발행 토픽 (stations/<ID>/sensor/result)"""
+    return f"{PREFIX}/{STATION_ID}/{topic}" if STATION_ID else topic
+
+
+def pool_topic(station="+"):
+    """그룹 대기열 토픽 (스테이션별 대기 상태, 기본값은 구독 필터, 그룹이 없으면 None)"""
+    return f"pool/{STATION_GROUP}/queue/{station}" if STATION_GROUP else None
+
+
+def pool_station(topic):
+    """그룹 대기열 토픽이면 스테이션 이름, 아니면 None"""
+    prefix = pool_topic("")
+    if prefix and topic.startswith(prefix) and len(topic) > len(prefix):
+        return topic[len(prefix):]
+    return None
+
+
+def shared(topic):
+    """공유 구독 필터 ($share/<그룹>/ult01), 그룹이 없으면 None"""
+    return f"$share/{STATION_GROUP}/{topic}" if STATION_GROUP else None
+
+
+def subscriptions(topics, jobs=(), pool=(), broadcast=(), qos=0):
+    """
+    구독 목록
+
+    Args:
+        topics: 이 스테이션으로 보내는 명령 토픽 (STATION_ID 가 있으면 stations/<ID>/ 아래만 구독)
+        jobs: 작업 분산 대상 명령 토픽 (그룹이 있으면 전역 토픽은 공유 구독으로만 받음)
+        pool: 그룹 대기열 순서로 처리하는 명령 토픽 (그룹이 있으면 전역 토픽을 모든 스테이션이 구독)
+        broadcast: 스테이션 구분 없이 모두 받는 토픽 (예: 주행 중단)
+
+    Returns:
+        list: [(토픽 필터, qos), ...]
+    """
+    filters = [out(topic) for topic in topics]
+    if STATION_ID or not STATION_GROUP:
+        filters += [out(topic) for topic in (*jobs, *pool)]
+    if STATION_GROUP and pool:
+        filters += [*pool, pool_topic()]
+    filters += broadcast
+    return [(f, qos) for f in dict.fromkeys(filters)]
+
+
+def name_of(topic):
+    """수신 토픽에서 스테이션 접두어를 떼어낸 원래 이름 (공유 구독 메시지는 원래 토픽으로 도착)"""
+    prefix = f"{PREFIX}/{STATION_ID}/"
+    if STATION_ID and topic.startswith(prefix):
+        return topic[len(prefix):]
+    return topic
+
+
+# =====================
+# 작업 되돌려 보내기 (MQTT v5)
+# =====================
+def requeue_count(msg):
+    """수신 메시지가 지금까지 되돌려 보내진 횟수"""
+    props = getattr(msg, "properties", None)
+    for key, value in getattr(props, "UserProperty", None) or []:
+        if key == REQUEUE_PROPERTY:
+            return int(value)
+    return 0
+
+
+def requeue_properties(count):
+    """되돌려 보낼 때 붙이는 발행 속성"""
+    props = Properties(PacketTypes.PUBLISH)
+    props.UserProperty = [(REQUEUE_PROPERTY, str(count))]
+    return props
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Maqueen RC카 주행 텔레메트리 디코더 / 주행 품질 분석
+micro:bit가 주행 중 보내는 바이너리 TEL 배치를 NumPy 배열로 풀고
+바퀴 상태를 등급으로 진단
+"""
+import numpy as np
+
+# =====================
+# 배치 포맷 (Rccar.py 와 동일해야 함)
+# =====================
+# 전송 프레임: 0xFE / 길이(u8) / 본문 (bluetooth_manager._split_telemetry 가 본문만 저장)
+# 본문 헤더 4바이트: seq(u8) / 샘플 수(u8) / 배치 시작 시각(u16 LE, 주행 시작 기준 ms)
+# 샘플 4바이트: dt(u8, 직전 샘플과의 간격 ms) / flags(u8) / 좌 모터(u8) / 우 모터(u8)
+#   flags bit0 = 왼쪽 라인센서, bit1 = 오른쪽 라인센서 (0 = 라인 위)
+#   flags bit2~7 = line_lost_count (최대 63)
+HEADER_SIZE = 4
+SAMPLE_DTYPE = np.dtype([
+    ("dt", "u1"),
+    ("flags", "u1"),
+    ("motor_l", "u1"),
+    ("motor_r", "u1"),
+])
+
+# =====================
+# 등급 기준
+# =====================
+GRADE_THRESHOLDS = {
+    # 등급: (라인 이탈 비율, 조향 치우침(트랙 기준값과의 차이), 최대 복귀 시간 ms, 진동 주파수 Hz)
+    "A": (0.05, 0.10, 300, 3.0),
+    "B": (0.15, 0.20, 700, 5.0),
+    "C": (0.30, 0.35, 1500, 8.0),
+}
+
+# 정상 차량이 이 트랙을 달릴 때의 조향 치우침 (곧은/대칭 트랙은 0, 한쪽으로 도는 트랙은 정상 차량으로 측정한 값)
+# → 커브 때문에 생기는 치우침을 바퀴 불량으로 판정하지 않도록 이 값과의 차이로 등급 계산
+TRACK_STEERING_BIAS = 0.0
+
+
+def decode_frame(raw):
+    """
+    TEL 프레임 본문 하나를 디코딩
+
+    Args:
+        raw (bytes): 프레임 본문 (헤더 + 샘플)
+
+    Returns:
+        tuple: (seq, 배치 시작 시각 ms, 샘플 배열) 또는 None (손상된 프레임)
+    """
+    if len(raw) < HEADER_SIZE:
+        return None
+
+    seq = raw[0]
+    count = raw[1]
+    t0 = raw[2] | (raw[3] << 8)
+    body = raw[HEADER_SIZE:]
+    if len(body) != count * SAMPLE_DTYPE.itemsize:
+        return None
+
+    return seq, t0, np.frombuffer(body, dtype=SAMPLE_DTYPE)
+
+
+def decode_frames(frames):
+    """
+    여러 TEL 프레임을 하나의 시계열로 합침 (중복 seq 제거, 시간순 정렬)
+
+    Returns:
+        tuple: (시각 배열 ms, 샘플 배열)
+    """
+    batches = {}
+    for raw in frames:
+        decoded = decode_frame(raw)
+        if decoded:
+            seq, t0, samples = decoded
+            batches[seq] = (t0, samples)
+
+    if not batches:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=SAMPLE_DTYPE)
+
+    ordered = sorted(batches.values(), key=lambda b: b[0])
+    times = np.concatenate([
+        t0 + np.cumsum(samples["dt"], dtype=np.int64) for t0, samples in ordered
+    ])
+    samples = np.concatenate([s for _, s in ordered])
+    return times, samples
+
+
+def analyze(frames, track_bias=TRACK_STEERING_BIAS):
+    """
+    주행 텔레메트리로 주행 품질 지표 계산
+
+    Args:
+        frames (list): 수신된 TEL 프레임 본문 목록
+        track_bias (float): 정상 차량의 이 트랙 조향 치우침 (TRACK_STEERING_BIAS)
+
+    Returns:
+        dict: 지표와 등급, 샘플이 없으면 None
+    """
+    times, samples = decode_frames(frames)
+    if len(samples) < 2:
+        return None
+
+    duration_s = max((times[-1] - times[0]) / 1000.0, 1e-3)
+    flags = samples["flags"]
+    left = flags & 0x01
+    right = (flags >> 1) & 0x01
+    motor_l = samples["motor_l"].astype(np.int32)
+    motor_r = samples["motor_r"].astype(np.int32)
+
+    # 진동 주파수: 조향 방향(좌우 모터 차이)의 부호가 바뀌는 횟수
+    steer = np.sign(motor_l - motor_r)
+    steer = steer[steer != 0]
+    flips = np.count_nonzero(np.diff(steer)) if len(steer) > 1 else 0
+    oscillation_hz = flips / 2.0 / duration_s
+
+    # 라인 이탈 비율: 양쪽 센서 모두 라인 밖
+    lost = (left == 1) & (right == 1)
+    line_lost_ratio = float(np.mean(lost))
+
+    # 복귀 시간: 이탈 구간마다 라인을 다시 찾을 때까지 걸린 시간
+    edges = np.diff(np.concatenate(([0], lost.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    ends_t = times[np.minimum(ends, len(times) - 1)]
+    recovery = ends_t - times[starts]
+    recovery_max_ms = int(recovery.max()) if len(recovery) else 0
+    recovery_mean_ms = float(recovery.mean()) if len(recovery) else 0.0
+
+    # 조향 치우침: 라인 위에 있던 샘플 중 우회전 보정(오른쪽 센서만 라인 위) - 좌회전 보정 비율
+    # 모터 값은 실제 회전이 아니라 라인 센서 상태에 따른 명령이므로, 바퀴 자체가 아니라
+    # 차량이 한쪽으로 밀려서 반대쪽 보정이 많아진 정도를 봄 (커브는 track_bias 로 보정)
+    on_line = (left == 0) | (right == 0)
+    turning_right = (left == 1) & (right == 0)
+    turning_left = (left == 0) & (right == 1)
+    on_count = np.count_nonzero(on_line)
+    steering_bias = (
+        float((np.count_nonzero(turning_right) - np.count_nonzero(turning_left)) / on_count)
+        if on_count else 0.0
+    )
+
+    metrics = {
+        "samples": int(len(samples)),
+        "duration_ms": int(times[-1] - times[0]),
+        "oscillation_hz": round(float(oscillation_hz), 2),
+        "line_lost_ratio": round(line_lost_ratio, 3),
+        "recovery_max_ms": recovery_max_ms,
+        "recovery_mean_ms": round(recovery_mean_ms, 1),
+        "lost_events": int(len(starts)),
+        "steering_bias": round(steering_bias, 3),  # +: 오른쪽 보정이 많음, -: 왼쪽
+        "steering_bias_delta": round(abs(steering_bias - track_bias), 3),
+    }
+    metrics["grade"] = grade(metrics)
+    return metrics
+
+
+def grade(metrics):
+    """지표를 A/B/C/F 등급으로 변환 (가장 나쁜 지표 기준)"""
+    for name, (lost, bias, recovery, osc) in GRADE_THRESHOLDS.items():
+        if (metrics["line_lost_ratio"] <= lost
+                and metrics["steering_bias_delta"] <= bias
+                and metrics["recovery_max_ms"] <= recovery
+                and metrics["oscillation_hz"] <= osc):
+            return name
+    return "F"
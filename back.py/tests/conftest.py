@@ -0,0 +1,5 @@
+import os
+import sys
+
+# back.py 모듈들은 서로 같은 폴더 기준으로 import 함
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
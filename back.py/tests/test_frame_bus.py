@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import frame_bus
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READER = """
+import sys
+sys.path.insert(0, {back!r})
+import frame_bus
+reader = frame_bus.FrameBusReader({name!r})
+item = reader.read_latest()
+print(item["camera"], int(item["frame"][0, 0, 0]))
+reader.close()
+"""
+
+
+def run_reader(name):
+    return subprocess.run(
+        [sys.executable, "-c", READER.format(back=BACK_DIR, name=name)],
+        capture_output=True, text=True, timeout=30
+    )
+
+
+@pytest.fixture
+def writer():
+    w = frame_bus.FrameBusWriter(name=f"test_frames_{os.getpid()}", slots=4, slot_bytes=8 * 8 * 3)
+    yield w
+    w.close()
+
+
+def test_reader_exit_does_not_remove_segment(writer):
+    writer.publish(2, np.full((8, 8, 3), 7, dtype=np.uint8))
+
+    # 리더 프로세스가 붙었다가 끝나도 세그먼트는 남아 있어야 함
+    for _ in range(2):
+        result = run_reader(writer.name)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.split() == ["2", "7"]
+        assert "leaked" not in result.stderr
+
+    assert os.path.exists(f"/dev/shm/{writer.name}")
+
+
+def test_read_next_and_latest(writer):
+    for i in range(1, 4):
+        writer.publish(i % 2 + 1, np.full((8, 8, 3), i, dtype=np.uint8))
+    reader = frame_bus.FrameBusReader(writer.name)
+    try:
+        seqs = []
+        while (item := reader.read_next()) is not None:
+            seqs.append(item["seq"])
+        assert seqs == [1, 2, 3]
+        latest = reader.read_latest(camera=2)
+        assert latest["seq"] == 3 and int(latest["frame"][0, 0, 0]) == 3
+        assert reader.is_valid(3)
+    finally:
+        reader.close()
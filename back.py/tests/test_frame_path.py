@@ -0,0 +1,37 @@
+import base64
+import json
+
+import pytest
+
+import frame_path
+
+
+@pytest.mark.parametrize("count", [0, 1, 3])
+def test_build_images_payload_matches_json_dumps(count):
+    images = [base64.b64encode(bytes([i]) * (10 + i)) for i in range(count)]
+    cameras = [f"usb-{i}" for i in range(count)]
+
+    payload = frame_path.build_images_payload(1234.5, images, "jpeg", cameras)
+
+    expected = {
+        "timestamp": 1234.5,
+        "images": [img.decode() for img in images],
+        "format": "jpeg",
+        "cameras": cameras,
+    }
+    assert isinstance(payload, bytearray)
+    assert bytes(payload) == json.dumps(expected).encode()  # 크기 계산이 맞으면 남는 0 바이트가 없음
+
+
+def test_encoder_reuses_resize_buffer():
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("cv2")
+    codec = {"ext": ".jpg", "params": []}
+    encoder = frame_path.FrameEncoder(320, lambda: codec)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    first = encoder.resize(frame)
+    second = encoder.resize(frame)
+    assert first.shape == (240, 320, 3)
+    assert second is first
+    assert base64.b64decode(encoder(frame))[:2] == b"\xff\xd8"  # JPEG
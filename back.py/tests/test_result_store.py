@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import result_store
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def store(tmp_path):
+    result_store.close_store()
+    conn = result_store.open_store(str(tmp_path / "results.db"))
+    yield conn
+    result_store.close_store()
+
+
+def add_car(conn, results, age_sec=0):
+    """차량 1대 + 결과 기록 (age_sec 만큼 과거 시각으로)"""
+    car_id = result_store.new_car()
+    for device, result in results:
+        result_store.record(device, result, duration_ms=100.0, car_id=car_id)
+    conn.execute("UPDATE results SET ts = ts - ? WHERE car_id = ?", (age_sec, car_id))
+    return car_id
+
+
+def test_defect_rate_counts_recent_cars(store):
+    add_car(store, [("LED", "OK"), ("ULTRASONIC", "DEFECT")])
+    add_car(store, [("LED", "DEFECT"), ("ULTRASONIC", "timeout")])
+    last = add_car(store, [("LED", "OK")])
+
+    rate = result_store.defect_rate("LED", last_cars=2)
+    assert (rate["total"], rate["defect"], rate["defect_rate"]) == (2, 1, 0.5)
+    assert (rate["cars"], rate["car_from"], rate["car_to"]) == (2, last - 1, last)
+
+    rate = result_store.defect_rate("ULTRASONIC")
+    assert (rate["total"], rate["defect"], rate["timeout"]) == (2, 1, 1)
+
+
+def test_defect_rate_survives_rollup(store):
+    old = add_car(store, [("LED", "DEFECT"), ("LED", "OK")], age_sec=10 * DAY)
+    new = add_car(store, [("LED", "OK")])
+    before = result_store.defect_rate("LED")
+
+    assert result_store.rollup() == 2
+    after = result_store.defect_rate("LED")
+    assert after == before
+    assert (after["cars"], after["car_from"], after["car_to"]) == (2, old, new)
+
+
+def test_rollup_keeps_timings(store, monkeypatch):
+    add_car(store, [("BUZZER", "OK")] * 3, age_sec=2 * 3600)
+    since = 3 * 3600
+    before = result_store.timings("BUZZER", since_sec=since)
+
+    monkeypatch.setattr(result_store, "RAW_RETENTION_SEC", 3600)
+    assert result_store.rollup() == 3
+
+    assert result_store.timings("BUZZER", since_sec=since)["count"] == before["count"] == 3
+    assert store.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+
+
+def test_rollup_drops_old_cars(store):
+    old = add_car(store, [("LED", "DEFECT")], age_sec=100 * DAY)
+    new = add_car(store, [("LED", "OK")], age_sec=100 * DAY)
+    store.execute("UPDATE cars SET started_at = started_at - ?", (100 * DAY,))
+    assert result_store.rollup() == 2
+
+    # 가장 최근 차량만 남고, 장치별 건수는 시간 단위 집계로 유지
+    assert [r[0] for r in store.execute("SELECT id FROM cars")] == [new]
+    assert [r[0] for r in store.execute("SELECT car_id FROM car_outcomes")] == [new]
+    assert store.execute("SELECT TOTAL(count) FROM rollups WHERE device = 'LED'").fetchone()[0] == 2
+    assert result_store.current_car() == new > old
+
+
+def test_query_dispatch(store):
+    add_car(store, [("WHEEL", "OK")])
+    assert result_store.query({"query": "recent", "limit": 1})["data"][0]["device"] == "WHEEL"
+    assert "error" in result_store.query({"query": "nope"})
+    assert time.time() - result_store.recent(1)[0]["ts"] < 60
@@ -0,0 +1,71 @@
+import pytest
+
+import station_topics
+
+TOPICS = ["drive/stop", "sensor/config"]
+
+
+@pytest.fixture
+def station(monkeypatch):
+    def configure(station_id=None, group=None):
+        monkeypatch.setattr(station_topics, "STATION_ID", station_id)
+        monkeypatch.setattr(station_topics, "STATION_GROUP", group)
+    return configure
+
+
+def filters(**kwargs):
+    return [f for f, _ in station_topics.subscriptions(
+        TOPICS, jobs=["ult01"], pool=["ult02"], broadcast=["drive/stop"], **kwargs)]
+
+
+def test_single_station_uses_global_topics(station):
+    station()
+    assert filters() == ["drive/stop", "sensor/config", "ult01", "ult02"]
+
+
+def test_station_id_prefixes_commands(station):
+    station("s1")
+    assert filters() == [
+        "stations/s1/drive/stop", "stations/s1/sensor/config",
+        "stations/s1/ult01", "stations/s1/ult02", "drive/stop",
+    ]
+
+
+def test_group_receives_drive_jobs_and_queue(station):
+    # 점검(ult01)은 작업 가능할 때만 공유 구독 (app.update_pool_membership) → 고정 구독에는 없음
+    station("s1", "line1")
+    result = filters()
+    assert "ult01" not in result and "$share/line1/ult01" not in result
+    assert {"stations/s1/ult01", "stations/s1/ult02", "ult02", "pool/line1/queue/+"} <= set(result)
+    assert len(result) == len(set(result))
+
+
+def test_group_without_station_id(station):
+    station(group="line1")
+    assert filters() == ["drive/stop", "sensor/config", "ult02", "pool/line1/queue/+"]
+    assert station_topics.shared("ult01") == "$share/line1/ult01"
+
+
+def test_pool_station_from_topic(station):
+    station("s1", "line1")
+    assert station_topics.pool_topic("s2") == "pool/line1/queue/s2"
+    assert station_topics.pool_station("pool/line1/queue/s2") == "s2"
+    assert station_topics.pool_station("pool/line1/queue/") is None
+    assert station_topics.pool_station("pool/line2/queue/s2") is None
+    station("s1")
+    assert station_topics.pool_station("pool/line1/queue/s2") is None
+
+
+def test_name_of_strips_own_prefix_only(station):
+    station("s1")
+    assert station_topics.name_of("stations/s1/ult02") == "ult02"
+    assert station_topics.name_of("stations/s2/ult02") == "stations/s2/ult02"
+    assert station_topics.name_of("ult01") == "ult01"
+
+
+def test_requeue_count_round_trip():
+    class Message:
+        properties = station_topics.requeue_properties(2)
+
+    assert station_topics.requeue_count(Message()) == 2
+    assert station_topics.requeue_count(object()) == 0
@@ -0,0 +1,105 @@
+import struct
+
+import pytest
+
+import bluetooth_manager as bt
+import telemetry
+
+ON, LEFT_OFF, RIGHT_OFF, LOST = 0b00, 0b01, 0b10, 0b11  # flags bit0 = 왼쪽, bit1 = 오른쪽 (1 = 라인 밖)
+
+
+def frame(seq, t0, samples):
+    """Rccar.py tel_flush 와 같은 본문 (헤더 + 샘플)"""
+    body = struct.pack("<BBH", seq, len(samples), t0)
+    for dt, flags, left, right in samples:
+        body += bytes([dt, flags, left, right])
+    return body
+
+
+def on_air(body):
+    """전송 프레임 (0xFE, 길이, 본문)"""
+    return bytes([bt.TEL_MARK, len(body)]) + body
+
+
+def straight(count, dt=40):
+    return [(dt, ON, 35, 35)] * count
+
+
+@pytest.fixture(autouse=True)
+def clean_buffers():
+    bt.clear_telemetry_frames()
+    bt.clear_received_messages()
+    yield
+    bt.clear_telemetry_frames()
+
+
+def test_decode_frames_orders_batches_and_drops_duplicates():
+    first = frame(0, 0, [(0, ON, 35, 35), (40, ON, 35, 35)])
+    second = frame(1, 100, [(0, LEFT_OFF, 25, 0), (40, ON, 35, 35)])
+    times, samples = telemetry.decode_frames([second, first, first])
+    assert times.tolist() == [0, 40, 100, 140]
+    assert samples["flags"].tolist() == [ON, ON, LEFT_OFF, ON]
+
+
+def test_decode_frame_rejects_truncated_body():
+    body = frame(0, 0, straight(3))
+    assert telemetry.decode_frame(body[:-1]) is None
+    assert telemetry.decode_frame(b"\x00") is None
+
+
+def test_analyze_straight_run_grades_a():
+    metrics = telemetry.analyze([frame(0, 0, straight(8)), frame(1, 320, straight(8))])
+    assert metrics["samples"] == 16
+    assert metrics["line_lost_ratio"] == 0
+    assert metrics["steering_bias"] == 0
+    assert metrics["grade"] == "A"
+
+
+def test_steering_bias_uses_line_state_and_track_baseline():
+    # 오른쪽 보정(오른쪽 센서만 라인 위)이 절반인 주행 → 곧은 트랙 기준이면 치우침
+    samples = [(40, LEFT_OFF, 0, 25), (40, ON, 35, 35)] * 8
+    drift = telemetry.analyze([frame(0, 0, samples)])
+    assert drift["steering_bias"] == 0.5
+    assert drift["grade"] == "F"
+
+    # 한쪽으로 도는 트랙에서 정상 차량이 같은 값을 내면 바퀴 불량으로 보지 않음
+    curve = telemetry.analyze([frame(0, 0, samples)], track_bias=0.5)
+    assert curve["steering_bias_delta"] == 0
+    assert curve["grade"] == "A"
+
+
+def test_analyze_needs_two_samples():
+    assert telemetry.analyze([]) is None
+    assert telemetry.analyze([frame(0, 0, straight(1))]) is None
+
+
+def test_tel_frames_reassembled_across_notifications():
+    bodies = [frame(0, 0, straight(8)), frame(1, 320, straight(5))]
+    stream = b"RESULT:ULT:OK\n" + on_air(bodies[0]) + on_air(bodies[1]) + b"RESULT:WHEEL:OK\n"
+    for i in range(0, len(stream), 20):  # BLE UART 알림 크기
+        bt._internal_notification_handler(None, bytearray(stream[i:i + 20]))
+
+    assert bt.get_telemetry_frames() == bodies
+    assert "".join(bt._received_messages) == "RESULT:ULT:OKRESULT:WHEEL:OK"
+
+
+def test_length_byte_split_from_mark():
+    body = frame(7, 0, straight(2))
+    data = on_air(body)
+    assert bt._split_telemetry(data[:1]) == b""
+    assert bt._split_telemetry(data[1:] + b"OK") == b"OK"
+    assert bt.get_telemetry_frames() == [body]
+
+
+def test_lost_frame_tail_does_not_swallow_result():
+    data = on_air(frame(0, 0, straight(8)))
+    assert bt._split_telemetry(data[:20], now=10.0) == b""
+    # 나머지 조각이 유실되고 한참 뒤 주행 결과가 도착
+    assert bt._split_telemetry(b"RESULT:DRIVE:OK\n", now=11.0) == b"RESULT:DRIVE:OK\n"
+    assert bt.get_telemetry_frames() == []
+
+
+def test_invalid_header_is_treated_as_text():
+    # 길이와 샘플 수가 맞지 않는 0xFE 뒤의 바이트는 일반 메시지로 다시 처리
+    assert bt._split_telemetry(bytes([bt.TEL_MARK]) + b"OK\n" + on_air(frame(1, 0, straight(2)))) == b"OK\n"
+    assert bt.get_telemetry_frames() == [frame(1, 0, straight(2))]
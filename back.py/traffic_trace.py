@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+BLE / MQTT 트래픽 기록
+BLE 알림, BLE 명령 쓰기, MQTT 수신/발행을 monotonic 시각과 함께 바이너리 파일로 기록
+(BLE / MQTT 콜백에서는 레코드를 큐에 넣기만 하고, 파일 쓰기는 기록 스레드에서)
+→ replay.py로 실제 app.py 로직에 다시 넣어서 현장 문제를 재현
+
+파일 형식
+  헤더  : b"MQTR" + 버전(u8)
+  레코드: 시각(f64, 기록 시작 기준 초) / 종류(u8) / 토픽 길이(u16) / 데이터 길이(u32) + 토픽 + 데이터
+"""
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+
+MAGIC = b"MQTR"
+VERSION = 1
+ENV_TRACE_DIR = "STATION_TRACE_DIR"  # 설정되어 있으면 시작 시 자동 기록
+
+# 레코드 종류
+BLE_NOTIFY = 1   # micro:bit → 라즈베리파이 알림
+BLE_WRITE = 2    # 라즈베리파이 → micro:bit 명령
+MQTT_IN = 3      # 수신한 MQTT 메시지
+MQTT_OUT = 4     # 발행한 MQTT 메시지
+
+KIND_NAMES = {
+    BLE_NOTIFY: "ble_notify",
+    BLE_WRITE: "ble_write",
+    MQTT_IN: "mqtt_in",
+    MQTT_OUT: "mqtt_out",
+}
+
+_RECORD = struct.Struct("<dBHI")
+QUEUE_MAX = 10000  # 기록 대기 레코드 수 (넘으면 버리고 개수만 셈)
+
+# 전역 변수
+_queue = None
+_writer = None
+_start = 0.0
+_dropped = 0
+_lock = threading.Lock()
+
+
+# =====================
+# 기록
+# =====================
+def start(path):
+    """기록 시작 (기존 파일은 덮어씀)"""
+    global _queue, _writer, _start, _dropped
+    stop()
+    f = open(path, "wb")
+    f.write(MAGIC + bytes([VERSION]))
+    q = queue.Queue(maxsize=QUEUE_MAX)
+    writer = threading.Thread(target=_write_loop, args=(f, q), name="traffic-trace", daemon=True)
+    with _lock:
+        _queue, _writer = q, writer
+        _start = time.monotonic()
+        _dropped = 0
+    writer.start()
+    print(f"📼 트래픽 기록 시작: {path}")
+    return path
+
+
+def start_from_env(name):
+    """환경 변수 STATION_TRACE_DIR 이 있으면 그 폴더에 기록 시작"""
+    trace_dir = os.environ.get(ENV_TRACE_DIR)
+    if not trace_dir:
+        return None
+    os.makedirs(trace_dir, exist_ok=True)
+    return start(os.path.join(trace_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.trace"))
+
+
+def stop():
+    """기록 종료 (큐에 남은 레코드까지 쓰고 파일을 닫음)"""
+    global _queue, _writer
+    with _lock:
+        q, writer = _queue, _writer
+        _queue = _writer = None
+    if q is None:
+        return
+    q.put(None)
+    writer.join(timeout=5)
+    if _dropped:
+        print(f"⚠️ 트래픽 기록 {_dropped}건 버림 (기록 큐 가득 참)")
+
+
+def is_recording():
+    return _queue is not None
+
+
+def _write_loop(f, q):
+    """기록 스레드: 큐의 레코드를 파일에 씀 (None 이면 종료)"""
+    with f:
+        while True:
+            chunk = q.get()
+            if chunk is None:
+                break
+            f.write(chunk)
+
+
+def record(kind, topic, payload):
+    """레코드 1건을 기록 큐에 넣음 (기록 중이 아니면 바로 반환)"""
+    global _dropped
+    q = _queue
+    if q is None:
+        return
+    if payload is None:
+        payload = b""
+    elif isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    elif isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = bytes(payload)
+    else:
+        payload = str(payload).encode("utf-8")  # paho 는 int / float 도 문자열로 발행
+    topic_bytes = (topic or "").encode("utf-8")
+
+    head = _RECORD.pack(time.monotonic() - _start, kind, len(topic_bytes), len(payload))
+    try:
+        q.put_nowait(head + topic_bytes + payload)
+    except queue.Full:
+        _dropped += 1
+
+
+def attach_mqtt(client):
+    """MQTT 클라이언트의 publish를 감싸서 발행 메시지 기록"""
+    original = client.publish
+
+    def publish(topic, payload=None, *args, **kwargs):
+        record(MQTT_OUT, topic, payload)
+        return original(topic, payload, *args, **kwargs)
+
+    client.publish = publish
+    return client
+
+
+# =====================
+# 읽기
+# =====================
+def read(path):
+    """
+    기록 파일 읽기
+
+    Returns:
+        list: [(시각, 종류, 토픽, 데이터 bytes), ...]
+    """
+    records = []
+    with open(path, "rb") as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"트래픽 기록 파일이 아님: {path}")
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                break  # 기록 중 종료된 파일은 마지막 레코드까지만
+            t, kind, topic_len, data_len = _RECORD.unpack(head)
+            topic = f.read(topic_len).decode("utf-8", "replace")
+            data = f.read(data_len)
+            if len(data) < data_len:
+                break
+            records.append((t, kind, topic, data))
+    return records